@@ -1,14 +1,20 @@
+import hashlib
+import anyio
+from cachetools import TTLCache
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from datetime import timedelta
 
 from core.auth import (
     authenticate_user, create_access_token, get_password_hash,
-    get_user_by_email, get_user_by_username, get_current_user,
+    get_user_by_email, email_exists, username_exists, get_current_user,
+    get_current_user_summary,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 from db.database import get_db
-from db.auth_models import User, PatientProfile
+from db.auth_models import User, UserRole, PatientProfile
 from schemas.auth_schemas import (
     UserCreate, UserLogin, Token, User as UserSchema, SocialAuth,
     ForgotPassword, ResetPassword
@@ -16,26 +22,45 @@ from schemas.auth_schemas import (
 
 router = APIRouter(prefix="/api/auth", tags=["authentication"])
 
+# Short-lived cache of successful password re-verifications for logged-in users.
+# Keyed by the stored hash too, so a password change (or rehash) invalidates entries.
+_auth_cache = TTLCache(maxsize=1024, ttl=15)
+
+async def _verify_current_password(db: Session, user: User, password: str) -> bool:
+    """Re-verify an authenticated user's password, skipping bcrypt on a recent hit"""
+    password_digest = hashlib.sha256(password.encode()).hexdigest()
+    if (user.id, user.hashed_password or "", password_digest) in _auth_cache:
+        return True
+    
+    authenticated = await anyio.to_thread.run_sync(authenticate_user, db, user.email, password)
+    if not authenticated:
+        return False
+    
+    # Only cache successes so wrong-password probes always pay the full cost. Key on the hash
+    # as stored after verification: verify_and_update may just have rehashed a legacy bcrypt hash
+    _auth_cache[(user.id, authenticated.hashed_password or "", password_digest)] = True
+    return True
+
 @router.post("/register", response_model=UserSchema)
-def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     """Register a new user"""
     
     # Check if email already exists
-    if get_user_by_email(db, user_data.email):
+    if email_exists(db, user_data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
     
     # Check if username already exists
-    if get_user_by_username(db, user_data.username):
+    if username_exists(db, user_data.username):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Username already taken"
         )
     
     # Create new user
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await anyio.to_thread.run_sync(get_password_hash, user_data.password)
     db_user = User(
         email=user_data.email,
         username=user_data.username,
@@ -44,8 +69,8 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    # Flush assigns id (and created_at via INSERT ... RETURNING) without a refresh SELECT
+    db.flush()
     
     # Create patient profile if role is patient
     if user_data.role == "patient":
@@ -56,15 +81,21 @@ def register_user(user_data: UserCreate, db: Session = Depends(get_db)):
             phone=user_data.phone
         )
         db.add(patient_profile)
-        db.commit()
     
-    return db_user
+    # Serialize before committing so the expired-on-commit attributes aren't reloaded;
+    # user and profile are still written in a single transaction
+    response = UserSchema.model_validate(db_user)
+    db.commit()
+    
+    return response
 
-@router.post("/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+@router.post("/login", response_model=Token, response_class=ORJSONResponse)
+async def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     """Login user and return JWT token"""
     
-    user = authenticate_user(db, user_credentials.email, user_credentials.password)
+    user = await anyio.to_thread.run_sync(
+        authenticate_user, db, user_credentials.email, user_credentials.password
+    )
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -78,20 +109,22 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
         expires_delta=access_token_expires
     )
     
-    return Token(
-        access_token=access_token,
-        token_type="bearer",
-        user_id=user.id,
-        role=user.role.value
-    )
+    # Returned as a ready Response so FastAPI skips Token validation/encoding;
+    # response_model stays on the route for the OpenAPI schema only
+    return ORJSONResponse({
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user_id": user.id,
+        "role": user.role.value
+    })
 
 @router.get("/me", response_model=UserSchema)
-def get_current_user_info(current_user: User = Depends(get_current_user)):
+def get_current_user_info(current_user: User = Depends(get_current_user_summary)):
     """Get current user information"""
     return current_user
 
 @router.put("/change-password")
-def change_password(
+async def change_password(
     current_password: str,
     new_password: str,
     current_user: User = Depends(get_current_user),
@@ -100,25 +133,25 @@ def change_password(
     """Change user password"""
     
     # Verify current password
-    if not authenticate_user(db, current_user.email, current_password):
+    if not await _verify_current_password(db, current_user, current_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
     # Update password
-    current_user.hashed_password = get_password_hash(new_password)
+    current_user.hashed_password = await anyio.to_thread.run_sync(get_password_hash, new_password)
     db.commit()
     
     return {"message": "Password updated successfully"}
 
 @router.post("/logout")
-def logout():
+async def logout():
     """Logout user (client should remove token)"""
     return {"message": "Successfully logged out"}
 
 @router.delete("/delete-account")
-def delete_account(
+async def delete_account(
     password: str,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -126,7 +159,7 @@ def delete_account(
     """Delete user account"""
     
     # Verify password before deletion
-    if not authenticate_user(db, current_user.email, password):
+    if not await _verify_current_password(db, current_user, password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Password is incorrect"
@@ -138,7 +171,7 @@ def delete_account(
     
     return {"message": "Account deactivated successfully"}
 
-@router.post("/social-auth", response_model=Token)
+@router.post("/social-auth", response_model=Token, response_class=ORJSONResponse)
 def social_auth(auth_data: SocialAuth, db: Session = Depends(get_db)):
     """Social authentication (Google, Facebook, etc.)"""
     
@@ -151,8 +184,13 @@ def social_auth(auth_data: SocialAuth, db: Session = Depends(get_db)):
         counter = 1
         original_username = username
         
-        # Ensure username is unique
-        while get_user_by_username(db, username):
+        # Ensure username is unique (fetch all colliding candidates in one query)
+        taken = {
+            row[0] for row in db.execute(
+                select(User.username).where(User.username.like(f"{original_username}%"))
+            ).all()
+        }
+        while username in taken:
             username = f"{original_username}{counter}"
             counter += 1
         
@@ -160,27 +198,25 @@ def social_auth(auth_data: SocialAuth, db: Session = Depends(get_db)):
             email=auth_data.email,
             username=username,
             hashed_password="",  # No password for social auth
-            role="patient",
+            role=UserRole.PATIENT,
             is_verified=True  # Social accounts are pre-verified
         )
         
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-        
         # Create patient profile
         names = auth_data.name.split(' ', 1)
         first_name = names[0] if names else ""
         last_name = names[1] if len(names) > 1 else ""
         
         patient_profile = PatientProfile(
-            user_id=user.id,
+            user=user,
             first_name=first_name,
             last_name=last_name,
             avatar_url=auth_data.avatar_url
         )
-        db.add(patient_profile)
-        db.commit()
+        
+        # User and profile are written in a single transaction; flush assigns user.id
+        db.add_all([user, patient_profile])
+        db.flush()
     
     # Generate access token
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -189,12 +225,17 @@ def social_auth(auth_data: SocialAuth, db: Session = Depends(get_db)):
         expires_delta=access_token_expires
     )
     
-    return Token(
-        access_token=access_token,
-        token_type="bearer",
-        user_id=user.id,
-        role=user.role.value
-    )
+    token_payload = {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "user_id": user.id,
+        "role": user.role.value
+    }
+    
+    # Commit after reading the user so its attributes aren't expired and re-selected
+    db.commit()
+    
+    return ORJSONResponse(token_payload)
 
 @router.post("/forgot-password")
 def forgot_password(request: ForgotPassword, db: Session = Depends(get_db)):
@@ -214,7 +255,7 @@ def forgot_password(request: ForgotPassword, db: Session = Depends(get_db)):
     return {"message": "If the email exists, a password reset link has been sent."}
 
 @router.post("/reset-password")
-def reset_password(request: ResetPassword, db: Session = Depends(get_db)):
+async def reset_password(request: ResetPassword):
     """Reset password using token"""
     
     # In a real implementation, you would:
@@ -230,7 +271,7 @@ def reset_password(request: ResetPassword, db: Session = Depends(get_db)):
     )
 
 @router.post("/verify-email/{token}")
-def verify_email(token: str, db: Session = Depends(get_db)):
+async def verify_email(token: str):
     """Verify user email with token"""
     
     # In a real implementation, you would:
@@ -1,75 +1,134 @@
-import sqlite3
 import json
+import aiosqlite
+import orjson
+from aiosqlitepool import SQLiteConnectionPool
 from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from typing import Any, AsyncIterator, Callable, Dict, Optional
 
 router = APIRouter(prefix="/api/direct", tags=["direct"])
 
-def get_database_connection():
-    """Get direct SQLite connection"""
-    return sqlite3.connect('curagenie.db')
+# Applied once per physical connection when the pool opens it
+CONNECTION_PRAGMAS = """
+PRAGMA journal_mode=WAL;
+PRAGMA synchronous=NORMAL;
+PRAGMA cache_size=-20000;
+"""
+
+async def _open_pooled_connection() -> aiosqlite.Connection:
+    """Open a WAL-mode SQLite connection for the pool"""
+    conn = await aiosqlite.connect('curagenie.db')
+    await conn.executescript(CONNECTION_PRAGMAS)
+    return conn
+
+# Long-lived connections reused across requests instead of one connect per call
+pool = SQLiteConnectionPool(_open_pooled_connection, pool_size=10)
+
+# Composite indexes backing the per-user / latest-per-disease lookups below and the
+# paginated per-user listings (also declared on the models for fresh databases)
+INDEXES_SQL = """
+CREATE INDEX IF NOT EXISTS ix_gd_user_id ON genomic_data(user_id, id DESC);
+CREATE INDEX IF NOT EXISTS ix_ps_gd_disease_id ON prs_scores(genomic_data_id, disease_type, id DESC);
+CREATE INDEX IF NOT EXISTS ix_genomic_user_time ON genomic_data(user_id, uploaded_at DESC);
+CREATE INDEX IF NOT EXISTS ix_ml_predictions_user_id_desc ON ml_predictions(user_id, id DESC);
+CREATE INDEX IF NOT EXISTS ix_mri_analyses_user_id_desc ON mri_analyses(user_id, id DESC);
+"""
+
+async def ensure_indexes():
+    """Create the direct-query indexes if missing (called on app startup)"""
+    async with pool.connection() as conn:
+        await conn.executescript(INDEXES_SQL)
+        await conn.commit()
+
+async def close_pool():
+    """Close pooled SQLite connections (called on app shutdown)"""
+    await pool.close()
+
+# Rows pulled per fetchmany() while streaming list responses
+STREAM_CHUNK_SIZE = 500
+
+async def _stream_json_rows(
+    query: str,
+    params: tuple,
+    transform: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+) -> AsyncIterator[bytes]:
+    """Run a query and stream its rows as a JSON array, one fetchmany() chunk at a time.
+    
+    The first item is an empty chunk yielded once the query has executed, so callers can
+    prime the generator and surface database errors before the response has started.
+    """
+    async with pool.connection() as conn:
+        async with conn.execute(query, params) as cursor:
+            cols = [c[0] for c in cursor.description]
+            yield b""
+            
+            yield b"["
+            separator = b""
+            while True:
+                rows = await cursor.fetchmany(STREAM_CHUNK_SIZE)
+                if not rows:
+                    break
+                records = (dict(zip(cols, row)) for row in rows)
+                if transform:
+                    records = (transform(record) for record in records)
+                yield separator + b",".join(orjson.dumps(record) for record in records)
+                separator = b","
+            yield b"]"
+
+async def _json_rows_response(query: str, params: tuple, transform=None) -> StreamingResponse:
+    """Prime a row stream (raising on query errors) and wrap it in a streaming response"""
+    body = _stream_json_rows(query, params, transform)
+    await body.__anext__()
+    return StreamingResponse(body, media_type="application/json")
+
+def _decode_metadata(record: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace the stored metadata_json text with its decoded form"""
+    raw_metadata = record.pop("metadata_json")
+    try:
+        record["metadata"] = json.loads(raw_metadata) if raw_metadata else {}
+    except:
+        record["metadata"] = {"raw": raw_metadata}
+    return record
 
 @router.get("/prs/user/{user_id}")
-def get_user_prs_scores_direct(user_id: str) -> List[Dict[str, Any]]:
+async def get_user_prs_scores_direct(user_id: str):
     """Get PRS scores for a user using direct SQL query"""
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        
         # Direct SQL query to get LATEST PRS scores for each disease (avoid duplicates)
         query = """
-        SELECT 
-            ps.id,
-            ps.genomic_data_id,
-            ps.disease_type,
-            ps.score,
-            ps.calculated_at,
-            gd.filename,
-            gd.status,
-            gd.uploaded_at
-        FROM prs_scores ps
-        JOIN genomic_data gd ON ps.genomic_data_id = gd.id
-        WHERE gd.user_id = ?
-        AND ps.id IN (
-            -- Get only the most recent PRS score for each disease type
-            SELECT MAX(ps2.id)
-            FROM prs_scores ps2
-            JOIN genomic_data gd2 ON ps2.genomic_data_id = gd2.id
-            WHERE gd2.user_id = ? AND ps2.disease_type = ps.disease_type
+        SELECT
+            id, genomic_data_id, disease_type, score, calculated_at,
+            filename, status AS genomic_status, uploaded_at
+        FROM (
+            SELECT 
+                ps.id,
+                ps.genomic_data_id,
+                ps.disease_type,
+                ps.score,
+                ps.calculated_at,
+                gd.filename,
+                gd.status,
+                gd.uploaded_at,
+                -- Rank each disease's scores newest-first; rn = 1 is the most recent
+                ROW_NUMBER() OVER (PARTITION BY ps.disease_type ORDER BY ps.id DESC) AS rn
+            FROM prs_scores ps
+            JOIN genomic_data gd ON ps.genomic_data_id = gd.id
+            WHERE gd.user_id = ?
         )
-        ORDER BY ps.disease_type ASC
+        WHERE rn = 1
+        ORDER BY disease_type ASC
         """
         
-        cursor.execute(query, (user_id, user_id))
-        rows = cursor.fetchall()
-        
-        # Convert to list of dictionaries
-        results = []
-        for row in rows:
-            results.append({
-                "id": row[0],
-                "genomic_data_id": row[1],
-                "disease_type": row[2],
-                "score": row[3],
-                "calculated_at": row[4],
-                "filename": row[5],
-                "genomic_status": row[6],
-                "uploaded_at": row[7]
-            })
-        
-        conn.close()
-        return results
+        # Column names come straight from the SELECT aliases; serialized by orjson as-is
+        return await _json_rows_response(query, (user_id,))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 @router.get("/genomic-data/user/{user_id}")
-def get_user_genomic_data_direct(user_id: str) -> List[Dict[str, Any]]:
+async def get_user_genomic_data_direct(user_id: str):
     """Get genomic data for a user using direct SQL query"""
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        
         # Direct SQL query to get genomic data
         query = """
         SELECT 
@@ -85,75 +144,48 @@ def get_user_genomic_data_direct(user_id: str) -> List[Dict[str, Any]]:
         ORDER BY id DESC
         """
         
-        cursor.execute(query, (user_id,))
-        rows = cursor.fetchall()
-        
-        # Convert to list of dictionaries
-        results = []
-        for row in rows:
-            metadata = {}
-            try:
-                metadata = json.loads(row[5]) if row[5] else {}
-            except:
-                metadata = {"raw": row[5]}
-                
-            results.append({
-                "id": row[0],
-                "user_id": row[1],
-                "filename": row[2],
-                "file_url": row[3],
-                "status": row[4],
-                "metadata": metadata,
-                "uploaded_at": row[6]
-            })
-        
-        conn.close()
-        return results
+        # Stream rows as a JSON array, decoding the stored metadata JSON per row
+        return await _json_rows_response(query, (user_id,), _decode_metadata)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
-@router.get("/dashboard-stats/user/{user_id}")
-def get_dashboard_stats_direct(user_id: str) -> Dict[str, Any]:
+@router.get("/dashboard-stats/user/{user_id}", response_class=ORJSONResponse)
+async def get_dashboard_stats_direct(user_id: str):
     """Get dashboard statistics for a user"""
     try:
-        conn = get_database_connection()
-        cursor = conn.cursor()
-        
-        # Get unique diseases count
-        diseases_query = "SELECT COUNT(DISTINCT ps.disease_type) FROM prs_scores ps JOIN genomic_data gd ON ps.genomic_data_id = gd.id WHERE gd.user_id = ?"
-        cursor.execute(diseases_query, (user_id,))
-        diseases_count = cursor.fetchone()[0] or 0
-        
-        # Get average score from latest upload only
-        avg_query = """
-        SELECT AVG(ps.score) 
-        FROM prs_scores ps
-        JOIN genomic_data gd ON ps.genomic_data_id = gd.id
-        WHERE gd.user_id = ? AND gd.id = (SELECT MAX(gd2.id) FROM genomic_data gd2 WHERE gd2.user_id = ?)
+        # All four aggregates in a single round-trip; `latest` is the most recent upload
+        stats_query = """
+        WITH latest AS (
+            SELECT id, status, uploaded_at
+            FROM genomic_data
+            WHERE user_id = ?
+            ORDER BY id DESC
+            LIMIT 1
+        )
+        SELECT
+            (SELECT COUNT(DISTINCT ps.disease_type)
+             FROM prs_scores ps
+             JOIN genomic_data gd ON ps.genomic_data_id = gd.id
+             WHERE gd.user_id = ?),
+            (SELECT AVG(ps.score)
+             FROM prs_scores ps
+             WHERE ps.genomic_data_id = (SELECT id FROM latest)),
+            (SELECT COUNT(*) FROM genomic_data WHERE user_id = ?),
+            (SELECT status FROM latest),
+            (SELECT uploaded_at FROM latest)
         """
-        cursor.execute(avg_query, (user_id, user_id))
-        avg_score = cursor.fetchone()[0] or 0
-        
-        # Get files processed count
-        files_query = "SELECT COUNT(*) FROM genomic_data WHERE user_id = ?"
-        cursor.execute(files_query, (user_id,))
-        files_count = cursor.fetchone()[0] or 0
         
-        # Get latest genomic data status
-        genomic_query = """
-        SELECT status, uploaded_at
-        FROM genomic_data 
-        WHERE user_id = ?
-        ORDER BY id DESC
-        LIMIT 1
-        """
-        cursor.execute(genomic_query, (user_id,))
-        latest_genomic = cursor.fetchone()
+        async with pool.connection() as conn:
+            async with conn.execute(stats_query, (user_id, user_id, user_id)) as cursor:
+                row = await cursor.fetchone()
         
-        conn.close()
+        diseases_count = row[0] or 0
+        avg_score = row[1] or 0
+        files_count = row[2] or 0
+        latest_genomic = (row[3], row[4]) if files_count else None
         
-        return {
+        return ORJSONResponse({
             "total_prs_scores": diseases_count,  # Use unique diseases count
             "average_risk_score": round(avg_score * 100, 1) if avg_score else 0,
             "diseases_analyzed": diseases_count,
@@ -161,7 +193,7 @@ def get_dashboard_stats_direct(user_id: str) -> Dict[str, Any]:
             "latest_status": latest_genomic[0] if latest_genomic else "no_data",
             "latest_upload": latest_genomic[1] if latest_genomic else None,
             "has_data": diseases_count > 0
-        }
+        })
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -1,22 +1,23 @@
 import os
 import uuid
-import json
 import logging
+import queue
+import threading
+import time
+import aiofiles
 import numpy as np
+import orjson
 import cv2
 import imutils
+from concurrent.futures import Future
 from datetime import datetime
 from typing import List, Optional, Dict, Any, Tuple
 from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
-from PIL import Image, ImageEnhance, ImageOps, ImageFilter
+from PIL import Image
 import io
-import tensorflow as tf
-from tensorflow.keras.models import load_model
-from tensorflow.keras.layers import Conv2D, Input, ZeroPadding2D, BatchNormalization, Activation, MaxPooling2D, Flatten, Dense
-from tensorflow.keras.models import Model
 
 from core.auth import get_current_active_patient
 from db.database import get_db
@@ -31,22 +32,351 @@ router = APIRouter(prefix="/api/enhanced-mri", tags=["enhanced-mri-analysis"])
 MRI_UPLOAD_DIR = "uploads/mri"
 os.makedirs(MRI_UPLOAD_DIR, exist_ok=True)
 
+# TensorFlow module, imported lazily by _load_tf() when the processor is created
+tf = None
+
+# Optional hard cap on TF's GPU memory; without it, memory grows on demand
+GPU_MEMORY_LIMIT_MB = int(os.getenv("MRI_GPU_MEMORY_LIMIT_MB", "0"))
+
+def _load_tf():
+    """Import and configure TensorFlow on first use"""
+    global tf
+    if tf is not None:
+        return tf
+    
+    # Let cuDNN benchmark convolution algorithms once and cache the fastest (must precede TF import)
+    os.environ.setdefault('TF_CUDNN_USE_AUTOTUNE', '1')
+    import tensorflow
+    
+    # Don't let TF grab the whole GPU up front
+    gpus = tensorflow.config.list_physical_devices('GPU')
+    for gpu in gpus:
+        if GPU_MEMORY_LIMIT_MB:
+            tensorflow.config.set_logical_device_configuration(
+                gpu, [tensorflow.config.LogicalDeviceConfiguration(memory_limit=GPU_MEMORY_LIMIT_MB)]
+            )
+        else:
+            tensorflow.config.experimental.set_memory_growth(gpu, True)
+    
+    # Run the CNN in mixed precision on GPUs (tensor cores); CPU-only hosts stay in FP32,
+    # where float16 is slower. Only newly built layers follow this; a model loaded from .h5
+    # is rebuilt under it by EnhancedMRIProcessor._apply_global_policy
+    if gpus:
+        tensorflow.keras.mixed_precision.set_global_policy('mixed_float16')
+    
+    # XLA-fuse Conv+BN+ReLU in the traced inference graph
+    tensorflow.config.optimizer.set_jit(True)
+    
+    tf = tensorflow
+    return tf
+
 # Model paths
+MODEL_DIR = "models"
 BRAIN_TUMOR_MODEL_PATH = "models/brain_tumor_model.h5"
+BRAIN_TUMOR_ONNX_PATH = "models/brain_tumor_model.onnx"
+BRAIN_TUMOR_TFLITE_PATH = "models/brain_tumor_model_int8.tflite"
+
+# CNN input tensor shape (batch of one)
+MODEL_INPUT_SHAPE = (1, 240, 240, 3)
+
+try:
+    from numba import njit
+    
+    @njit(cache=True, fastmath=True)
+    def _bbox_from_contour(points: np.ndarray) -> Tuple[int, int, int, int]:
+        """Bounding box (x0, y0, x1, y1) of an (N, 2) contour point array in one fused pass"""
+        x0 = x1 = points[0, 0]
+        y0 = y1 = points[0, 1]
+        for i in range(1, points.shape[0]):
+            x = points[i, 0]
+            y = points[i, 1]
+            if x < x0:
+                x0 = x
+            elif x > x1:
+                x1 = x
+            if y < y0:
+                y0 = y
+            elif y > y1:
+                y1 = y
+        return x0, y0, x1, y1
+except ImportError:
+    # Numba is optional; numpy reductions are the next fastest thing
+    def _bbox_from_contour(points: np.ndarray) -> Tuple[int, int, int, int]:
+        """Bounding box (x0, y0, x1, y1) of an (N, 2) contour point array"""
+        x0, y0 = points.min(axis=0)
+        x1, y1 = points.max(axis=0)
+        return x0, y0, x1, y1
+
+# Remote Triton inference server (gRPC host:port); when set, no model is loaded in-process
+TRITON_URL = os.getenv("TRITON_URL", "")
+TRITON_MODEL_NAME = os.getenv("TRITON_MODEL_NAME", "brain_tumor")
+
+class TritonRunner:
+    """Runs the brain tumor CNN on a Triton inference server over gRPC.
+    
+    Input/output names and the input datatype are read from the server's model metadata,
+    so the same client works for TensorRT, ONNX or SavedModel deployments of the model.
+    Needs the optional tritonclient[grpc] package.
+    """
+    
+    def __init__(self, url: str, model_name: str):
+        import tritonclient.grpc as grpcclient
+        
+        self._grpc = grpcclient
+        self.client = grpcclient.InferenceServerClient(url=url)
+        self.model_name = model_name
+        if not self.client.is_model_ready(model_name):
+            raise RuntimeError(f"Triton model '{model_name}' is not ready at {url}")
+        
+        metadata = self.client.get_model_metadata(model_name)
+        self._input_name = metadata.inputs[0].name
+        self._input_datatype = metadata.inputs[0].datatype
+        self._output_name = metadata.outputs[0].name
+        self._input_dtype = np.float16 if self._input_datatype == "FP16" else np.float32
+    
+    def __call__(self, image_batch: np.ndarray) -> np.ndarray:
+        """Predict tumor probabilities for a (N, 240, 240, 3) float32 batch"""
+        batch = image_batch.astype(self._input_dtype, copy=False)
+        infer_input = self._grpc.InferInput(self._input_name, list(batch.shape), self._input_datatype)
+        infer_input.set_data_from_numpy(batch)
+        result = self.client.infer(
+            self.model_name,
+            inputs=[infer_input],
+            outputs=[self._grpc.InferRequestedOutput(self._output_name)]
+        )
+        return result.as_numpy(self._output_name).astype(np.float32, copy=False)
+
+class TensorRTRunner:
+    """Runs the brain tumor CNN through a serialized TensorRT engine.
+    
+    The Keras model is exported to ONNX and built into an FP16 engine the first time;
+    the engine is cached on disk per GPU compute capability. Needs the optional
+    tensorrt, pycuda and tf2onnx packages.
+    """
+    
+    def __init__(self, keras_model):
+        import tensorrt as trt
+        import pycuda.driver as cuda
+        
+        cuda.init()
+        self._cuda = cuda
+        self._ctx = cuda.Device(0).make_context()
+        self._lock = threading.Lock()
+        try:
+            trt_logger = trt.Logger(trt.Logger.WARNING)
+            major, minor = cuda.Device(0).compute_capability()
+            engine_path = os.path.join(MODEL_DIR, f"brain_tumor_model_sm{major}{minor}.engine")
+            
+            if os.path.exists(engine_path):
+                with open(engine_path, "rb") as f:
+                    serialized_engine = f.read()
+            else:
+                serialized_engine = self._build_engine(trt, trt_logger, keras_model)
+                with open(engine_path, "wb") as f:
+                    f.write(serialized_engine)
+            
+            self.engine = trt.Runtime(trt_logger).deserialize_cuda_engine(serialized_engine)
+            self.context = self.engine.create_execution_context()
+            if -1 in tuple(self.engine.get_binding_shape(0)):
+                # Dynamic-batch ONNX export; this engine's profile only covers batch size 1
+                self.context.set_binding_shape(0, MODEL_INPUT_SHAPE)
+            self.stream = cuda.Stream()
+            
+            # Pinned host buffers + device buffers, allocated once
+            self.h_input = cuda.pagelocked_empty(MODEL_INPUT_SHAPE, dtype=np.float32)
+            self.h_output = cuda.pagelocked_empty((1, 1), dtype=np.float32)
+            self.d_input = cuda.mem_alloc(self.h_input.nbytes)
+            self.d_output = cuda.mem_alloc(self.h_output.nbytes)
+        finally:
+            self._ctx.pop()
+    
+    @staticmethod
+    def _build_engine(trt, trt_logger, keras_model) -> bytes:
+        """Export the Keras model to ONNX and build a serialized TensorRT engine"""
+        import onnx
+        import tf2onnx
+        
+        # Dynamic batch dimension and fixed tensor names, so the same ONNX file also builds the
+        # batched plan served by Triton (see triton/brain_tumor/config.pbtxt)
+        onnx_model, _ = tf2onnx.convert.from_keras(
+            keras_model,
+            input_signature=[tf.TensorSpec((None,) + MODEL_INPUT_SHAPE[1:], tf.float32, name="input")]
+        )
+        output_name = onnx_model.graph.output[0].name
+        for node in onnx_model.graph.node:
+            node.output[:] = ["output" if name == output_name else name for name in node.output]
+        onnx_model.graph.output[0].name = "output"
+        onnx.save(onnx_model, BRAIN_TUMOR_ONNX_PATH)
+        
+        builder = trt.Builder(trt_logger)
+        network = builder.create_network(1 << int(trt.NetworkDefinitionCreationFlag.EXPLICIT_BATCH))
+        parser = trt.OnnxParser(network, trt_logger)
+        with open(BRAIN_TUMOR_ONNX_PATH, "rb") as f:
+            if not parser.parse(f.read()):
+                raise RuntimeError(f"ONNX parse failed: {parser.get_error(0)}")
+        
+        config = builder.create_builder_config()
+        profile = builder.create_optimization_profile()
+        profile.set_shape("input", MODEL_INPUT_SHAPE, MODEL_INPUT_SHAPE, MODEL_INPUT_SHAPE)
+        config.add_optimization_profile(profile)
+        if builder.platform_has_fast_fp16:
+            config.set_flag(trt.BuilderFlag.FP16)
+        
+        serialized_engine = builder.build_serialized_network(network, config)
+        if serialized_engine is None:
+            raise RuntimeError("TensorRT engine build failed")
+        return bytes(serialized_engine)
+    
+    def __call__(self, image_batch: np.ndarray) -> np.ndarray:
+        """Predict tumor probabilities for a (N, 240, 240, 3) float32 batch"""
+        if image_batch.shape[0] != 1:
+            # The engine is built for batch size 1
+            return np.concatenate([self(image_batch[i:i + 1]) for i in range(image_batch.shape[0])])
+        
+        cuda = self._cuda
+        with self._lock:
+            self._ctx.push()
+            try:
+                np.copyto(self.h_input, image_batch)
+                cuda.memcpy_htod_async(self.d_input, self.h_input, self.stream)
+                self.context.execute_async_v2([int(self.d_input), int(self.d_output)], self.stream.handle)
+                cuda.memcpy_dtoh_async(self.h_output, self.d_output, self.stream)
+                self.stream.synchronize()
+                return self.h_output.copy()
+            finally:
+                self._ctx.pop()
+
+class TFLiteRunner:
+    """Runs the INT8-quantized brain tumor CNN with the TFLite interpreter.
+    
+    Used on CPU-only deployments that ship the flatbuffer produced by
+    quantize_brain_tumor_model.py instead of the Keras .h5 model.
+    """
+    
+    def __init__(self, model_path: str):
+        self.interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=os.cpu_count())
+        self.interpreter.allocate_tensors()
+        self._input_index = self.interpreter.get_input_details()[0]["index"]
+        self._output_index = self.interpreter.get_output_details()[0]["index"]
+        self._lock = threading.Lock()
+    
+    def __call__(self, image_batch: np.ndarray) -> np.ndarray:
+        """Predict tumor probabilities for a (N, 240, 240, 3) float32 batch"""
+        outputs = []
+        with self._lock:
+            # The interpreter's input tensor is fixed at batch size 1
+            for i in range(image_batch.shape[0]):
+                self.interpreter.set_tensor(self._input_index, image_batch[i:i + 1])
+                self.interpreter.invoke()
+                outputs.append(self.interpreter.get_tensor(self._output_index))
+        return np.concatenate(outputs)
+
+# Micro-batching limits for concurrent CNN requests
+MAX_BATCH = 8
+MAX_WAIT_MS = 20
+
+class InferenceBatcher:
+    """Collects concurrent single-image requests into one CNN forward pass.
+    
+    Analyses run in BackgroundTasks worker threads, so requests are handed to a single
+    batching thread over a thread-safe queue and each caller waits on its own future.
+    """
+    
+    def __init__(self, predict_fn, max_batch: int = MAX_BATCH, max_wait_ms: int = MAX_WAIT_MS):
+        self._predict_fn = predict_fn
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000.0
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="mri-inference-batcher", daemon=True)
+        self._worker.start()
+    
+    def predict(self, image_batch: np.ndarray) -> np.ndarray:
+        """Queue a preprocessed batch and block until its predictions are ready"""
+        future: Future = Future()
+        self._queue.put((image_batch, future))
+        return future.result()
+    
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self._max_wait
+            while len(items) < self._max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            try:
+                predictions = self._predict_fn(np.concatenate([batch for batch, _ in items], axis=0))
+            except Exception as e:
+                for _, future in items:
+                    future.set_exception(e)
+                continue
+            
+            # Hand each caller back the rows that belong to its input
+            offset = 0
+            for batch, future in items:
+                future.set_result(predictions[offset:offset + batch.shape[0]])
+                offset += batch.shape[0]
 
 class EnhancedMRIProcessor:
     """Enhanced MRI image processing using the Brain-Tumor-Detection CNN model"""
     
     def __init__(self):
         self.model = None
+        self.triton_runner = None
+        self.trt_runner = None
+        self.tflite_runner = None
+        self._infer = None
+        # 5x5 opening == two 3x3 erosions followed by two 3x3 dilations
+        self._morph_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+        # Per-thread (1, 240, 240, 3) input buffers; background tasks preprocess concurrently
+        self._in_bufs = threading.local()
         self.load_brain_tumor_model()
+        self.batcher = InferenceBatcher(self.predict_batch)
+    
+    @property
+    def model_loaded(self) -> bool:
+        """Whether any inference backend (Triton, Keras or TFLite) is available"""
+        return (
+            self.triton_runner is not None
+            or self.model is not None
+            or self.tflite_runner is not None
+        )
     
     def load_brain_tumor_model(self):
         """Load the pre-trained brain tumor detection model"""
+        # Inference served by Triton keeps TensorFlow out of the API process entirely
+        if TRITON_URL:
+            try:
+                self.triton_runner = TritonRunner(TRITON_URL, TRITON_MODEL_NAME)
+                logger.info(f"✅ Using Triton model '{TRITON_MODEL_NAME}' at {TRITON_URL}")
+                self._warm_up()
+                return
+            except Exception as e:
+                self.triton_runner = None
+                logger.error(f"❌ Triton unavailable, loading the model locally: {e}")
+        
+        _load_tf()
+        
+        # CPU-only deployments may ship just the INT8 TFLite model
+        if not os.path.exists(BRAIN_TUMOR_MODEL_PATH) and os.path.exists(BRAIN_TUMOR_TFLITE_PATH):
+            try:
+                self.tflite_runner = TFLiteRunner(BRAIN_TUMOR_TFLITE_PATH)
+                logger.info("✅ INT8 TFLite brain tumor model loaded")
+                self._warm_up()
+                return
+            except Exception as e:
+                self.tflite_runner = None
+                logger.error(f"❌ Error loading TFLite brain tumor model: {e}")
+        
         try:
             if os.path.exists(BRAIN_TUMOR_MODEL_PATH):
                 logger.info("Loading pre-trained brain tumor detection model...")
-                self.model = load_model(BRAIN_TUMOR_MODEL_PATH)
+                self.model = self._apply_global_policy(tf.keras.models.load_model(BRAIN_TUMOR_MODEL_PATH))
                 logger.info("✅ Brain tumor model loaded successfully")
             else:
                 logger.warning("⚠️ Pre-trained model not found, creating new model architecture")
@@ -56,9 +386,55 @@ class EnhancedMRIProcessor:
             logger.error(f"❌ Error loading brain tumor model: {e}")
             self.model = self.build_brain_tumor_model()
             logger.info("✅ Fallback brain tumor model architecture created")
+        
+        # Graph-mode forward pass with a fixed signature: no per-call predict() loop or retracing
+        self._infer = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec([None, 240, 240, 3], tf.float32)]
+        )
+        
+        # Prefer a TensorRT engine when the GPU stack is available; otherwise stay on Keras
+        try:
+            self.trt_runner = TensorRTRunner(self.model)
+            logger.info("✅ TensorRT engine ready for brain tumor inference")
+        except Exception as e:
+            self.trt_runner = None
+            logger.info(f"TensorRT unavailable, using Keras inference: {e}")
+        
+        self._warm_up()
+    
+    def _apply_global_policy(self, model):
+        """Rebuild a loaded model under the global mixed-precision policy, keeping its weights"""
+        if tf.keras.mixed_precision.global_policy().name != 'mixed_float16':
+            return model
+        # Layers deserialized from .h5 keep their saved float32 policy; only a freshly built
+        # graph picks up the global one (its variables stay float32, so the weights carry over)
+        try:
+            mixed = self.build_brain_tumor_model()
+            mixed.set_weights(model.get_weights())
+            logger.info("Brain tumor model rebuilt for mixed_float16 inference")
+            return mixed
+        except ValueError as e:
+            logger.warning(f"⚠️ Saved model doesn't match the known architecture, keeping float32: {e}")
+            return model
+    
+    def _warm_up(self):
+        """Run dummy forward passes so the first real request doesn't pay kernel/XLA compilation"""
+        dummy = np.zeros(MODEL_INPUT_SHAPE, dtype=np.float32)
+        # With XLA enabled the first call traces and the second triggers compilation
+        passes = 2 if tf is not None and tf.config.optimizer.get_jit() else 1
+        try:
+            for _ in range(passes):
+                self.predict_batch(dummy)
+            logger.info("✅ Brain tumor model warmed up")
+        except Exception as e:
+            logger.warning(f"⚠️ Model warm-up failed: {e}")
     
     def build_brain_tumor_model(self):
         """Build the CNN model architecture from the GitHub repository"""
+        from tensorflow.keras.layers import Conv2D, Input, ZeroPadding2D, BatchNormalization, Activation, MaxPooling2D, Flatten, Dense
+        from tensorflow.keras.models import Model
+        
         input_shape = (240, 240, 3)
         
         # Define the input placeholder as a tensor with shape input_shape
@@ -81,7 +457,9 @@ class EnhancedMRIProcessor:
         # FLATTEN X
         X = Flatten()(X)  # shape=(?, 6272)
         # FULLYCONNECTED
-        X = Dense(1, activation='sigmoid', name='fc')(X)  # shape=(?, 1)
+        # Output kept in float32 so the sigmoid/loss stay numerically safe under mixed precision
+        X = Dense(1, name='fc', dtype='float32')(X)  # shape=(?, 1)
+        X = Activation('sigmoid', dtype='float32')(X)
         
         # Create model
         model = Model(inputs=X_input, outputs=X, name='BrainDetectionModel')
@@ -91,28 +469,34 @@ class EnhancedMRIProcessor:
         
         return model
     
-    def crop_brain_contour(self, image, plot=False):
+    def predict_batch(self, image_batch: np.ndarray) -> np.ndarray:
+        """Run the CNN on a preprocessed (N, 240, 240, 3) float32 batch"""
+        if self.triton_runner is not None:
+            return self.triton_runner(image_batch)
+        if self.trt_runner is not None:
+            return self.trt_runner(image_batch)
+        if self.tflite_runner is not None:
+            return self.tflite_runner(image_batch)
+        return self._infer(tf.constant(image_batch)).numpy()
+    
+    def crop_brain_contour(self, image: np.ndarray, plot=False) -> np.ndarray:
         """
         Crop the brain contour from the image - adapted from the GitHub repository
         """
         try:
-            # Convert PIL Image to numpy array for OpenCV processing
-            if isinstance(image, Image.Image):
-                image = np.array(image)
-            
-            # Convert to OpenCV format (BGR)
-            if len(image.shape) == 3 and image.shape[2] == 3:
-                image = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
-            
-            # Convert the image to grayscale, and blur it slightly
-            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+            # Convert the RGB(A) image straight to grayscale, and blur it slightly
+            if image.ndim == 2:
+                gray = image
+            elif image.shape[2] == 4:
+                gray = cv2.cvtColor(image, cv2.COLOR_RGBA2GRAY)
+            else:
+                gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
             gray = cv2.GaussianBlur(gray, (5, 5), 0)
 
-            # Threshold the image, then perform a series of erosions +
-            # dilations to remove any small regions of noise
+            # Threshold the image, then perform a morphological opening
+            # to remove any small regions of noise
             thresh = cv2.threshold(gray, 45, 255, cv2.THRESH_BINARY)[1]
-            thresh = cv2.erode(thresh, None, iterations=2)
-            thresh = cv2.dilate(thresh, None, iterations=2)
+            thresh = cv2.morphologyEx(thresh, cv2.MORPH_OPEN, self._morph_kernel)
 
             # Find contours in thresholded image, then grab the largest one
             cnts = cv2.findContours(thresh.copy(), cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
@@ -124,22 +508,40 @@ class EnhancedMRIProcessor:
             
             c = max(cnts, key=cv2.contourArea)
 
-            # Find the extreme points
-            extLeft = tuple(c[c[:, :, 0].argmin()][0])
-            extRight = tuple(c[c[:, :, 0].argmax()][0])
-            extTop = tuple(c[c[:, :, 1].argmin()][0])
-            extBot = tuple(c[c[:, :, 1].argmax()][0])
+            # Find the extreme points: the contour's bounding box
+            x0, y0, x1, y1 = _bbox_from_contour(c.reshape(-1, 2))
 
-            # crop new image out of the original image using the four extreme points
-            new_image = image[extTop[1]:extBot[1], extLeft[0]:extRight[0]]
+            # crop new image out of the original image using the extreme points
+            new_image = image[y0:y1, x0:x1]
             
             return new_image
             
         except Exception as e:
             logger.warning(f"Brain contour cropping failed: {e}, returning original image")
-            return image if isinstance(image, np.ndarray) else np.array(image)
+            return image
+    
+    @staticmethod
+    def _to_model_input(image_array: np.ndarray) -> np.ndarray:
+        """Resize an image array to the 240x240 RGB uint8 model input"""
+        resized = cv2.resize(image_array, (240, 240), interpolation=cv2.INTER_AREA)
+        if resized.ndim == 2:
+            resized = cv2.cvtColor(resized, cv2.COLOR_GRAY2RGB)
+        elif resized.shape[2] == 4:
+            resized = cv2.cvtColor(resized, cv2.COLOR_RGBA2RGB)
+        return resized
+    
+    def _normalize_into_buffer(self, image_resized: np.ndarray) -> np.ndarray:
+        """Scale a (240, 240, 3) uint8 image into this thread's reusable float32 batch buffer.
+        
+        Safe to reuse: the batcher copies inputs (np.concatenate) and callers block until done.
+        """
+        buf = getattr(self._in_bufs, 'buf', None)
+        if buf is None:
+            buf = self._in_bufs.buf = np.empty(MODEL_INPUT_SHAPE, dtype=np.float32)
+        np.multiply(image_resized, np.float32(1.0 / 255.0), out=buf[0], casting='unsafe')
+        return buf
     
-    def preprocess_image_for_model(self, image: Image.Image) -> np.ndarray:
+    def preprocess_image_for_model(self, image: np.ndarray) -> np.ndarray:
         """
         Preprocess image for the CNN model - adapted from the GitHub repository
         """
@@ -147,25 +549,11 @@ class EnhancedMRIProcessor:
             # Crop the brain contour
             cropped_image = self.crop_brain_contour(image)
             
-            # Convert back to PIL Image if it's numpy array
-            if isinstance(cropped_image, np.ndarray):
-                if len(cropped_image.shape) == 3:
-                    cropped_image = Image.fromarray(cv2.cvtColor(cropped_image, cv2.COLOR_BGR2RGB))
-                else:
-                    cropped_image = Image.fromarray(cropped_image)
+            # Resize to model input size (240, 240) and ensure 3 RGB channels
+            image_resized = self._to_model_input(cropped_image)
             
-            # Resize to model input size (240, 240)
-            image_resized = cropped_image.resize((240, 240), Image.Resampling.LANCZOS)
-            
-            # Convert to RGB if not already
-            if image_resized.mode != 'RGB':
-                image_resized = image_resized.convert('RGB')
-            
-            # Convert to numpy array and normalize
-            image_array = np.array(image_resized, dtype=np.float32) / 255.0
-            
-            # Add batch dimension
-            image_batch = np.expand_dims(image_array, axis=0)
+            # Normalize into the preallocated batch buffer
+            image_batch = self._normalize_into_buffer(image_resized)
             
             logger.info(f"Image preprocessed successfully: {image_batch.shape}")
             return image_batch
@@ -173,28 +561,31 @@ class EnhancedMRIProcessor:
         except Exception as e:
             logger.error(f"Image preprocessing failed: {e}")
             # Fallback preprocessing
-            image_resized = image.resize((240, 240), Image.Resampling.LANCZOS)
-            if image_resized.mode != 'RGB':
-                image_resized = image_resized.convert('RGB')
-            image_array = np.array(image_resized, dtype=np.float32) / 255.0
-            return np.expand_dims(image_array, axis=0)
+            image_resized = self._to_model_input(image)
+            return self._normalize_into_buffer(image_resized)
     
-    def analyze_with_cnn_model(self, image: Image.Image) -> Dict[str, Any]:
+    def analyze_with_cnn_model(self, image: np.ndarray, original_size: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
         """
         Analyze MRI image using the CNN model from Brain-Tumor-Detection repository
+        
+        Expects an RGB uint8 array; it is passed through cropping and resizing without
+        further conversions. original_size is the (width, height) of the uploaded image
+        when it was decoded at reduced scale; coordinates are reported in that space.
         """
         try:
             logger.info("🧠 Starting CNN-based brain tumor analysis...")
             
-            if self.model is None:
+            if not self.model_loaded:
                 raise Exception("CNN model not loaded")
             
+            width, height = original_size or (image.shape[1], image.shape[0])
+            
             # Preprocess image for the model
             processed_image = self.preprocess_image_for_model(image)
             
             # Make prediction
             logger.info("Making prediction with CNN model...")
-            prediction = self.model.predict(processed_image, verbose=0)
+            prediction = self.batcher.predict(processed_image)
             
             # Extract probability
             tumor_probability = float(prediction[0][0])
@@ -222,10 +613,10 @@ class EnhancedMRIProcessor:
                     "probability": float(round(tumor_probability, 4)),
                     "characteristics": characteristics,
                     "bbox": {
-                        "x": int(image.size[0] * 0.2),
-                        "y": int(image.size[1] * 0.2),
-                        "width": int(image.size[0] * 0.6),
-                        "height": int(image.size[1] * 0.6)
+                        "x": int(width * 0.2),
+                        "y": int(height * 0.2),
+                        "width": int(width * 0.6),
+                        "height": int(height * 0.6)
                     },
                     "volume_mm3": int(characteristics.get("estimated_volume_mm3", 1000))
                 }]
@@ -236,14 +627,18 @@ class EnhancedMRIProcessor:
                 detected_regions = []
                 characteristics = {}
             
+            volumes = np.fromiter(
+                (r["volume_mm3"] for r in detected_regions), dtype=np.int64, count=len(detected_regions)
+            )
+            
             # Overall assessment
             overall_assessment = {
                 "tumor_detected": has_tumor,
                 "tumor_probability": float(round(tumor_probability, 4)),
                 "risk_level": risk_level,
                 "confidence": float(round(confidence, 3)),
-                "total_tumor_volume_mm3": sum(r.get("volume_mm3", 0) for r in detected_regions),
-                "num_regions_detected": len(detected_regions),
+                "total_tumor_volume_mm3": int(volumes.sum()),
+                "num_regions_detected": int(volumes.size),
                 "model_used": "CNN_BrainTumorDetection"
             }
             
@@ -259,7 +654,7 @@ class EnhancedMRIProcessor:
                 "overall_assessment": overall_assessment,
                 "detected_regions": detected_regions,
                 "image_quality": {
-                    "resolution": f"{image.size[0]}x{image.size[1]}",
+                    "resolution": f"{width}x{height}",
                     "preprocessing_applied": "brain_contour_cropping",
                     "contrast_quality": "good"
                 },
@@ -295,7 +690,7 @@ class EnhancedMRIProcessor:
         else:
             return "low"
     
-    def _estimate_tumor_type(self, probability: float, image: Image.Image) -> str:
+    def _estimate_tumor_type(self, probability: float, image: np.ndarray) -> str:
         """Estimate tumor type based on probability and image characteristics"""
         # Simple heuristic based on probability ranges
         if probability >= 0.9:
@@ -307,7 +702,7 @@ class EnhancedMRIProcessor:
         else:
             return "benign_lesion"
     
-    def _estimate_tumor_characteristics(self, probability: float, image: Image.Image) -> Dict[str, Any]:
+    def _estimate_tumor_characteristics(self, probability: float, image: np.ndarray) -> Dict[str, Any]:
         """Estimate tumor characteristics"""
         return {
             "estimated_volume_mm3": int(probability * 2000 + 500),
@@ -364,26 +759,58 @@ class EnhancedMRIProcessor:
             "This AI analysis should be confirmed by professional radiologist review"
         ]
     
+    @staticmethod
+    def load_dicom_array(file_path: str) -> np.ndarray:
+        """Decode a DICOM file's pixel data to a uint8 RGB array"""
+        import pydicom
+        
+        pixels = pydicom.dcmread(file_path).pixel_array.astype(np.float32)
+        if pixels.ndim == 3 and pixels.shape[-1] not in (3, 4):
+            # Multi-frame series: analyze the middle slice
+            pixels = pixels[pixels.shape[0] // 2]
+        low, high = float(pixels.min()), float(pixels.max())
+        scale = 255.0 / (high - low) if high > low else 0.0
+        pixels = ((pixels - low) * scale).astype(np.uint8)
+        return cv2.cvtColor(pixels, cv2.COLOR_GRAY2RGB) if pixels.ndim == 2 else pixels[..., :3]
+    
     @staticmethod
     def validate_mri_image(file_content: bytes, filename: str) -> Dict[str, Any]:
         """Validate uploaded MRI image"""
         try:
-            # Try to open the image
-            image = Image.open(io.BytesIO(file_content))
+            if filename.lower().endswith(('.dcm', '.dicom')) or file_content[128:132] == b'DICM':
+                # DICOM: read the header only; pixels are decoded by the analysis task
+                import pydicom
+                
+                header = pydicom.dcmread(io.BytesIO(file_content), stop_before_pixels=True)
+                image = None
+                image_format = "DICOM"
+                size = (int(header.Columns), int(header.Rows))
+                mode = "L" if str(header.get("PhotometricInterpretation", "")).startswith("MONOCHROME") else "RGB"
+            else:
+                # Try to open the image (header only; PIL decodes lazily)
+                image = Image.open(io.BytesIO(file_content))
+                image_format = image.format
+                size = image.size
+                mode = image.mode
+                # Let libjpeg decode at reduced scale (still >= 240x240, all the CNN input needs);
+                # results are reported against the header size kept in "size"
+                if image_format == "JPEG":
+                    image.draft('RGB', (240, 240))
             
             # Basic validation
             validation_result = {
                 "valid": True,
-                "format": image.format,
-                "size": image.size,
-                "mode": image.mode,
+                "image": image,  # reused by the analysis task so the upload isn't re-opened
+                "format": image_format,
+                "size": size,
+                "mode": mode,
                 "file_size": len(file_content),
-                "is_grayscale": image.mode in ['L', 'LA'],
+                "is_grayscale": mode in ['L', 'LA'],
                 "estimated_type": "brain_scan" if any(term in filename.lower() for term in ['brain', 'head', 'mri', 'scan']) else "medical_image"
             }
             
             # Check if image dimensions are reasonable for MRI
-            width, height = image.size
+            width, height = size
             if width < 50 or height < 50:
                 validation_result["valid"] = False
                 validation_result["error"] = "Image dimensions too small for MRI analysis"
@@ -398,44 +825,62 @@ class EnhancedMRIProcessor:
                 "error": f"Invalid image file: {str(e)}"
             }
 
-# Global processor instance
-mri_processor = EnhancedMRIProcessor()
+_mri_processor: Optional[EnhancedMRIProcessor] = None
+_mri_processor_lock = threading.Lock()
+
+def get_mri_processor() -> EnhancedMRIProcessor:
+    """Shared processor, created on first use so importing the router doesn't load TensorFlow"""
+    global _mri_processor
+    if _mri_processor is None:
+        # Concurrent first requests must not each load the model (and start a batcher thread)
+        with _mri_processor_lock:
+            if _mri_processor is None:
+                _mri_processor = EnhancedMRIProcessor()
+    return _mri_processor
 
-def process_enhanced_mri_analysis_background(analysis_id: int, file_path: str, file_content: bytes):
+def _mri_model_loaded() -> bool:
+    """Model status for the info endpoints; doesn't create the processor just to report it"""
+    return _mri_processor is not None and _mri_processor.model_loaded
+
+def process_enhanced_mri_analysis_background(analysis_id: int, file_path: str, image: Optional[Image.Image], image_size: Tuple[int, int], file_size: int):
     """Background task for processing MRI analysis with CNN model"""
     import time
     import traceback
     from db.database import SessionLocal
     
     db = SessionLocal()
-    analysis_record = None
+    analysis_query = db.query(MRIAnalysis).filter(MRIAnalysis.id == analysis_id)
     
     try:
         logger.info(f"🔬 Starting enhanced CNN MRI analysis for analysis_id: {analysis_id}")
         
-        # Get analysis record
-        analysis_record = db.query(MRIAnalysis).filter(MRIAnalysis.id == analysis_id).first()
-        if not analysis_record:
+        # Update status to analyzing in a single UPDATE; no matched row means no record
+        updated = analysis_query.update(
+            {"status": "analyzing", "analysis_started_at": func.now()},
+            synchronize_session=False
+        )
+        db.commit()
+        if not updated:
             logger.error(f"❌ MRI analysis record {analysis_id} not found in database")
             return {"status": "error", "message": "Analysis record not found"}
-        
-        # Update status to analyzing
-        analysis_record.status = "analyzing"
-        analysis_record.analysis_started_at = func.now()
-        db.commit()
         logger.info(f"📊 Updated status to 'analyzing'")
         
-        # Load and validate image
+        # Image was already opened and validated by the upload handler (DICOM headers only)
         logger.info(f"🖼️ Processing uploaded image...")
-        image = Image.open(io.BytesIO(file_content))
-        original_size = image.size
-        logger.info(f"Image loaded: {original_size[0]}x{original_size[1]}, format: {image.format}")
+        original_size = image_size
+        
+        # Decode to an RGB array once; everything downstream works on this array
+        if image is None:
+            image_array = get_mri_processor().load_dicom_array(file_path)
+        else:
+            image_array = np.asarray(image.convert('RGB'))
+        logger.info(f"Image loaded: {original_size[0]}x{original_size[1]}, decoded: {image_array.shape[1]}x{image_array.shape[0]}")
         
         # Run CNN-based analysis
         logger.info(f"🤖 Running CNN-based tumor detection...")
         start_time = time.time()
         
-        analysis_result = mri_processor.analyze_with_cnn_model(image)
+        analysis_result = get_mri_processor().analyze_with_cnn_model(image_array, original_size)
         
         processing_time = time.time() - start_time
         logger.info(f"📈 CNN analysis completed in {processing_time:.2f} seconds")
@@ -449,16 +894,17 @@ def process_enhanced_mri_analysis_background(analysis_id: int, file_path: str, f
                 "processing_time_seconds": round(processing_time, 2),
                 "analysis_timestamp": datetime.utcnow().isoformat(),
                 "original_image_size": f"{original_size[0]}x{original_size[1]}",
-                "file_size_kb": round(len(file_content) / 1024, 1)
+                "file_size_kb": round(file_size / 1024, 1)
             })
             
-            # Save results to database
-            analysis_record.status = "completed"
-            analysis_record.analysis_completed_at = func.now()
-            analysis_record.results_json = json.dumps(analysis_result, indent=2)
-            analysis_record.overall_risk_level = overall_assessment.get("risk_level", "low")
-            analysis_record.confidence_score = overall_assessment.get("confidence", 0.0)
-            
+            # Save results to database in one UPDATE; the DB clock stamps completion
+            analysis_query.update({
+                "status": "completed",
+                "analysis_completed_at": func.now(),
+                "results_json": orjson.dumps(analysis_result).decode(),
+                "overall_risk_level": overall_assessment.get("risk_level", "low"),
+                "confidence_score": overall_assessment.get("confidence", 0.0)
+            }, synchronize_session=False)
             db.commit()
             
             logger.info(f"✅ Enhanced MRI analysis completed successfully!")
@@ -484,14 +930,13 @@ def process_enhanced_mri_analysis_background(analysis_id: int, file_path: str, f
         
         # Update database with error status
         try:
-            if analysis_record is None:
-                analysis_record = db.query(MRIAnalysis).filter(MRIAnalysis.id == analysis_id).first()
-            
-            if analysis_record:
-                analysis_record.status = "failed"
-                analysis_record.error_message = f"Enhanced processing failed: {error_msg}"
-                analysis_record.analysis_completed_at = func.now()
-                db.commit()
+            db.rollback()
+            analysis_query.update({
+                "status": "failed",
+                "error_message": f"Enhanced processing failed: {error_msg}",
+                "analysis_completed_at": func.now()
+            }, synchronize_session=False)
+            db.commit()
         except Exception as db_error:
             logger.error(f"❌ Failed to update database with error: {db_error}")
         
@@ -540,9 +985,9 @@ async def upload_enhanced_mri_scan(
         
         logger.info(f"Starting enhanced MRI upload for user {current_user.id}, file: {file.filename}")
         
-        # Save file locally
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        # Save file locally without blocking the event loop
+        async with aiofiles.open(file_path, "wb") as f:
+            await f.write(file_content)
         
         # Create database record
         mri_analysis = MRIAnalysis(
@@ -550,26 +995,28 @@ async def upload_enhanced_mri_scan(
             filename=file.filename,
             file_path=file_path,
             status="processing",
-            metadata_json=json.dumps({
+            metadata_json=orjson.dumps({
                 "analysis_type": "enhanced_cnn",
                 "model_used": "Brain_Tumor_Detection_CNN",
                 "file_size_bytes": len(file_content),
                 "image_format": validation_result.get("format"),
                 "image_size": validation_result.get("size"),
                 "upload_timestamp": datetime.utcnow().isoformat()
-            })
+            }).decode()
         )
         
         db.add(mri_analysis)
-        db.commit()
-        db.refresh(mri_analysis)
+        await run_in_threadpool(db.commit)
+        await run_in_threadpool(db.refresh, mri_analysis)
         
         # Queue background processing task
         background_tasks.add_task(
             process_enhanced_mri_analysis_background,
             mri_analysis.id,
             file_path,
-            file_content
+            validation_result["image"],
+            validation_result["size"],
+            len(file_content)
         )
         
         logger.info(f"Enhanced MRI upload queued for processing: analysis_id: {mri_analysis.id}")
@@ -620,7 +1067,7 @@ async def test_cnn_analysis(
         logger.info(f"Test CNN analysis - Image: {image.size}, format: {image.format}, mode: {image.mode}")
         
         # Run CNN analysis
-        analysis_result = mri_processor.analyze_with_cnn_model(image)
+        analysis_result = get_mri_processor().analyze_with_cnn_model(np.asarray(image.convert('RGB')))
         
         return {
             "success": True,
@@ -635,7 +1082,7 @@ async def test_cnn_analysis(
             },
             "analysis_result": analysis_result,
             "model_info": {
-                "model_loaded": mri_processor.model is not None,
+                "model_loaded": get_mri_processor().model_loaded,
                 "model_path": BRAIN_TUMOR_MODEL_PATH,
                 "model_exists": os.path.exists(BRAIN_TUMOR_MODEL_PATH)
             }
@@ -651,7 +1098,7 @@ async def test_cnn_analysis(
 def get_model_info():
     """Get information about the loaded CNN model"""
     return {
-        "model_loaded": mri_processor.model is not None,
+        "model_loaded": _mri_model_loaded(),
         "model_path": BRAIN_TUMOR_MODEL_PATH,
         "model_file_exists": os.path.exists(BRAIN_TUMOR_MODEL_PATH),
         "model_architecture": {
@@ -684,7 +1131,7 @@ def test_enhanced_mri_endpoint():
     return {
         "message": "Enhanced MRI Analysis API is working",
         "model_status": {
-            "cnn_model_loaded": mri_processor.model is not None,
+            "cnn_model_loaded": _mri_model_loaded(),
             "model_path": BRAIN_TUMOR_MODEL_PATH,
             "model_exists": os.path.exists(BRAIN_TUMOR_MODEL_PATH)
         },
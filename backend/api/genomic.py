@@ -1,29 +1,35 @@
 import uuid
 import logging
-import json
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from datetime import datetime
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List
-import boto3
+from typing import List, Optional
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 
 from db.database import get_db
 from db.models import GenomicData
-from schemas.schemas import GenomicDataResponse, UploadResponse
+from schemas.schemas import GenomicDataResponse, UploadResponse, PresignedUploadResponse
 from core.config import settings
+from core.storage import s3_client
 from cg_worker.tasks import process_genomic_file
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/genomic-data", tags=["genomic-data"])
 
-# Initialize S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=settings.aws_access_key_id,
-    aws_secret_access_key=settings.aws_secret_access_key,
-    region_name=settings.aws_region
+# Concurrent multipart uploads: memory stays O(chunk size) regardless of file size
+s3_transfer_config = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True
 )
 
+# Allowed genomic file types (tuple so one str.endswith call checks them all) and presigned upload lifetime
+ALLOWED_EXTENSIONS = ('.vcf', '.fastq', '.fq', '.vcf.gz', '.fastq.gz')
+PRESIGN_EXPIRES_SECONDS = 3600
+
 @router.post("/upload", response_model=UploadResponse, status_code=202)
 async def upload_genomic_file(
     user_id: str,
@@ -36,12 +42,10 @@ async def upload_genomic_file(
     """
     try:
         # Validate file type
-        allowed_extensions = ['.vcf', '.fastq', '.fq', '.vcf.gz', '.fastq.gz']
-        file_extension = '.' + file.filename.lower().split('.')[-1]
-        if not any(file.filename.lower().endswith(ext.lower()) for ext in allowed_extensions):
+        if not file.filename.lower().endswith(ALLOWED_EXTENSIONS):
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+                detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
         # Generate unique file key for S3
@@ -50,17 +54,20 @@ async def upload_genomic_file(
         
         logger.info(f"Starting upload for user {user_id}, file: {file.filename}")
         
-        # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
+        # Measure the spooled upload without reading it into memory
+        file.file.seek(0, 2)
+        file_size = file.file.tell()
+        file.file.seek(0)
         
-        # Upload to S3
+        # Stream to S3 (multipart for large files) off the event loop
         try:
-            s3_client.put_object(
-                Bucket=settings.s3_bucket_name,
-                Key=s3_key,
-                Body=file_content,
-                ContentType=file.content_type or 'application/octet-stream'
+            await run_in_threadpool(
+                s3_client.upload_fileobj,
+                file.file,
+                settings.s3_bucket_name,
+                s3_key,
+                ExtraArgs={"ContentType": file.content_type or 'application/octet-stream'},
+                Config=s3_transfer_config
             )
             logger.info(f"Successfully uploaded {file.filename} to S3: {s3_key}")
         except ClientError as e:
@@ -73,7 +80,7 @@ async def upload_genomic_file(
             filename=file.filename,
             file_url=s3_key,  # Store S3 key as file_url
             status="processing",
-            metadata_json=json.dumps({"file_size_bytes": file_size, "uploaded_at": str(uuid.uuid4())})
+            metadata_json={"file_size_bytes": file_size, "uploaded_at": datetime.utcnow().isoformat()}
         )
         
         db.add(genomic_data)
@@ -97,11 +104,115 @@ async def upload_genomic_file(
         logger.error(f"Unexpected error during upload: {e}")
         raise HTTPException(status_code=500, detail="Internal server error during upload")
 
+@router.post("/presign", response_model=PresignedUploadResponse, status_code=201)
+def presign_genomic_upload(
+    user_id: str,
+    filename: str,
+    content_type: str = "application/octet-stream",
+    db: Session = Depends(get_db)
+):
+    """
+    Create a pending genomic data record and a presigned S3 POST
+    so the client uploads the file directly to S3
+    """
+    if not filename.lower().endswith(ALLOWED_EXTENSIONS):
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
+        )
+    
+    s3_key = f"users/{user_id}/uploads/{uuid.uuid4()}_{filename}"
+    
+    # Persist the record before handing out the URL so the upload can always be matched
+    genomic_data = GenomicData(
+        user_id=user_id,
+        filename=filename,
+        file_url=s3_key,
+        status="pending_upload",
+        metadata_json={"upload_method": "s3_presigned"}
+    )
+    db.add(genomic_data)
+    db.commit()
+    db.refresh(genomic_data)
+    
+    try:
+        presigned = s3_client.generate_presigned_post(
+            Bucket=settings.s3_bucket_name,
+            Key=s3_key,
+            Fields={"Content-Type": content_type},
+            Conditions=[{"Content-Type": content_type}],
+            ExpiresIn=PRESIGN_EXPIRES_SECONDS
+        )
+    except ClientError as e:
+        logger.error(f"Failed to presign S3 upload: {e}")
+        genomic_data.status = "failed"
+        db.commit()
+        raise HTTPException(status_code=500, detail="Failed to prepare file upload")
+    
+    logger.info(f"Presigned upload for user {user_id}, genomic_data_id: {genomic_data.id}")
+    
+    return PresignedUploadResponse(
+        genomic_data_id=genomic_data.id,
+        url=presigned["url"],
+        fields=presigned["fields"],
+        key=s3_key
+    )
+
+@router.post("/{genomic_data_id}/uploaded", response_model=UploadResponse, status_code=202)
+def complete_genomic_upload(genomic_data_id: int, db: Session = Depends(get_db)):
+    """
+    Queue processing once a presigned upload has landed in S3.
+    Called by the client after its POST, or by an S3 event notification handler.
+    """
+    genomic_data = db.query(GenomicData).filter(GenomicData.id == genomic_data_id).first()
+    if not genomic_data:
+        raise HTTPException(status_code=404, detail="Genomic data not found")
+    if genomic_data.status != "pending_upload":
+        # Already queued (e.g. both the client and the S3 event reported the upload)
+        return UploadResponse(id=genomic_data.id, message="Upload already received.", status=genomic_data.status)
+    
+    try:
+        head = s3_client.head_object(Bucket=settings.s3_bucket_name, Key=genomic_data.file_url)
+    except ClientError:
+        raise HTTPException(status_code=409, detail="File has not been uploaded to storage yet")
+    
+    # Claim the row atomically so concurrent completions (client + S3 event) queue it only once
+    claimed = db.query(GenomicData).filter(
+        GenomicData.id == genomic_data_id,
+        GenomicData.status == "pending_upload"
+    ).update({
+        "status": "processing",
+        "metadata_json": {
+            "upload_method": "s3_presigned",
+            "file_size_bytes": head["ContentLength"]
+        }
+    }, synchronize_session=False)
+    db.commit()
+    if claimed != 1:
+        db.refresh(genomic_data)
+        return UploadResponse(id=genomic_data.id, message="Upload already received.", status=genomic_data.status)
+    
+    process_genomic_file.delay(genomic_data.id)
+    logger.info(f"Queued processing for genomic_data_id: {genomic_data.id}")
+    
+    return UploadResponse(
+        id=genomic_data.id,
+        message="File received. Processing started.",
+        status="processing"
+    )
+
 @router.get("/user/{user_id}", response_model=List[GenomicDataResponse])
-def get_user_genomic_data(user_id: str, db: Session = Depends(get_db)):
-    """Get all genomic data records for a user"""
-    genomic_data = db.query(GenomicData).filter(GenomicData.user_id == user_id).all()
-    return genomic_data
+def get_user_genomic_data(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get a user's genomic data records, newest first; pass the last id as cursor for the next page"""
+    query = db.query(GenomicData).filter(GenomicData.user_id == user_id)
+    if cursor is not None:
+        query = query.filter(GenomicData.id < cursor)
+    return query.order_by(GenomicData.id.desc()).limit(limit).all()
 
 @router.get("/{genomic_data_id}", response_model=GenomicDataResponse)
 def get_genomic_data(genomic_data_id: int, db: Session = Depends(get_db)):
@@ -1,22 +1,103 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, selectinload
+from typing import List, Optional, TextIO
+import csv
+import gzip
 import json
 import re
 from datetime import datetime
+from functools import lru_cache
+import numpy as np
+import pandas as pd
 
 from db.database import get_db
 from db.models import GenomicData, PrsScore
-from genomic_utils import GenomicProcessor
 
 router = APIRouter(prefix="/api/genomic", tags=["genomic-variants"])
 
+# Leading "chr"/"CHR" on chromosome names
+_CHR_PREFIX = re.compile(r'^(?:chr|CHR)')
+
+# Known important regions per chromosome: (start, end)
+_IMPORTANT_REGIONS = {
+    "19": [
+        (11200000, 11250000),  # LDLR region
+        (45400000, 45450000),  # APOE region
+    ],
+    "6": [(20600000, 20700000)],  # HLA region
+}
+
+# Common disease-associated loci
+_DISEASE_LOCI = {
+    "cardiovascular_disease": [
+        {"chr": "1", "pos": 55505647},  # PCSK9
+        {"chr": "2", "pos": 21286757},  # APOB
+        {"chr": "19", "pos": 11217748}, # LDLR
+    ],
+    "diabetes_type2": [
+        {"chr": "6", "pos": 20679709},  # HLA region
+        {"chr": "10", "pos": 94452862}, # TCF7L2
+        {"chr": "11", "pos": 2161612},  # INS
+    ],
+    "alzheimer_disease": [
+        {"chr": "19", "pos": 45411941}, # APOE
+        {"chr": "11", "pos": 59923508}, # MS4A6A
+        {"chr": "2", "pos": 127892810}, # BIN1
+    ]
+}
+
+# Sorted (starts, ends) arrays per chromosome for np.searchsorted lookups;
+# regions on a chromosome must not overlap
+_REGION_BOUNDS = {
+    chrom: (
+        np.array([start for start, _ in sorted(regions)], dtype=np.int64),
+        np.array([end for _, end in sorted(regions)], dtype=np.int64)
+    )
+    for chrom, regions in _IMPORTANT_REGIONS.items()
+}
+
+# Disease name spellings seen in PRS rows -> _DISEASE_LOCI key
+_DISEASE_ALIAS = {
+    name: key
+    for key in _DISEASE_LOCI
+    for name in (key, key.replace('_', ' '), key.replace('_', ' ').title())
+}
+
+def _disease_key(disease_type: str) -> Optional[str]:
+    """Resolve a PRS disease name to its _DISEASE_LOCI key"""
+    key = _DISEASE_ALIAS.get(disease_type)
+    if key is None:
+        # Uncommon spelling: normalize, then look up again
+        key = _DISEASE_ALIAS.get(disease_type.lower().replace(" ", "_"))
+    return key
+
+# Precompute locus ids once
+for _loci in _DISEASE_LOCI.values():
+    for _locus in _loci:
+        _locus["id"] = f"{_locus['chr']}:{_locus['pos']}"
+
+_NP_RNG = np.random.default_rng()
+
+# Fixed VCF columns; sample columns beyond INFO are ignored
+_VCF_COLUMNS = ["chrom", "pos", "id", "ref", "alt", "qual", "filter", "info"]
+
+# Records parsed per pandas chunk when streaming a VCF from disk
+VCF_CHUNK_ROWS = 100_000
+
+# Empty fields appended to each data line so short records still parse (see _VCFDataText)
+_VCF_ROW_PAD = '\t' * (len(_VCF_COLUMNS) - 1)
+
+# Characters read per block while searching for the end of the VCF header
+VCF_HEADER_BLOCK_CHARS = 64 * 1024
+
 @router.get("/variants/{user_id}")
 def get_genomic_variants(user_id: str, db: Session = Depends(get_db)):
     """Get genomic variants for visualization"""
     
-    # Get the user's genomic data files
-    genomic_files = db.query(GenomicData).filter(
+    # Get the user's genomic data files, with their PRS scores for the fallback below
+    genomic_files = db.query(GenomicData).options(
+        selectinload(GenomicData.prs_scores)
+    ).filter(
         GenomicData.user_id == user_id,
         GenomicData.status == "completed"
     ).all()
@@ -25,18 +106,14 @@ def get_genomic_variants(user_id: str, db: Session = Depends(get_db)):
         return []
     
     all_variants = []
-    processor = GenomicProcessor()
     
     for genomic_file in genomic_files:
         try:
-            # Read the file content
-            with open(genomic_file.file_url, 'r') as f:
-                file_content = f.read().encode()
-            
-            # Parse variants from VCF
-            if genomic_file.filename.lower().endswith('.vcf') or genomic_file.filename.lower().endswith('.vcf.gz'):
-                variants = parse_vcf_variants(file_content.decode())
-                all_variants.extend(variants)
+            # Stream variants from the VCF on disk (gzipped or plain)
+            if genomic_file.filename.lower().endswith(('.vcf', '.vcf.gz')):
+                opener = gzip.open if genomic_file.file_url.endswith('.gz') else open
+                with opener(genomic_file.file_url, 'rt') as f:
+                    all_variants.extend(parse_vcf_variants_stream(f))
                 
         except Exception as e:
             print(f"Error processing genomic file {genomic_file.filename}: {e}")
@@ -44,131 +121,164 @@ def get_genomic_variants(user_id: str, db: Session = Depends(get_db)):
     
     # If no variants found from files, create some representative variants based on PRS data
     if not all_variants:
-        prs_scores = db.query(PrsScore).join(GenomicData).filter(
-            GenomicData.user_id == user_id
-        ).all()
+        prs_scores = [prs for genomic_file in genomic_files for prs in genomic_file.prs_scores]
         
         if prs_scores:
             all_variants = generate_representative_variants(prs_scores)
     
-    # Sort by chromosome and position
-    all_variants.sort(key=lambda v: (chromosome_sort_key(v['chromosome']), v['position']))
+    # Sort by chromosome and position (list.sort computes each key once: decorate-sort-undecorate)
+    all_variants.sort(key=variant_sort_key)
     
     return all_variants
 
-def parse_vcf_variants(vcf_content: str) -> List[dict]:
-    """Parse VCF content and extract variants with importance scores"""
-    variants = []
-    
-    lines = vcf_content.strip().split('\n')
+def parse_vcf_variants_stream(lines: TextIO) -> List[dict]:
+    """Parse an open VCF text stream in chunks and extract variants with importance scores"""
+    data = _VCFDataText(_skip_vcf_header(lines), lines)
     
-    for line in lines:
-        if line.startswith('#') or not line.strip():
-            continue
-            
-        try:
-            parts = line.split('\t')
-            if len(parts) < 8:
-                continue
-                
-            chrom = parts[0]
-            pos = int(parts[1])
-            variant_id = parts[2] if parts[2] != '.' else f"{chrom}:{pos}"
-            ref = parts[3]
-            alt = parts[4]
-            qual = float(parts[5]) if parts[5] != '.' else 0
-            info = parts[7] if len(parts) > 7 else ""
-            
-            # Calculate importance based on quality and INFO fields
-            importance = calculate_variant_importance(qual, info, chrom, pos)
-            
-            variants.append({
-                "chromosome": clean_chromosome(chrom),
-                "position": pos,
-                "importance": importance,
-                "id": variant_id,
-                "ref": ref,
-                "alt": alt,
-                "quality": qual
-            })
-            
-        except (ValueError, IndexError) as e:
-            continue
+    # Parse the records in C, a bounded chunk at a time
+    variants = []
+    try:
+        for chunk in _read_vcf_records(data, chunksize=VCF_CHUNK_ROWS):
+            variants.extend(_score_vcf_records(chunk))
+    except pd.errors.EmptyDataError:
+        pass
     
     return variants
 
-def generate_representative_variants(prs_scores: List[PrsScore]) -> List[dict]:
-    """Generate representative variants based on PRS scores"""
-    variants = []
+def _skip_vcf_header(lines: TextIO) -> str:
+    """Consume the '#' header block; return the data text read past it"""
+    # Read in blocks and jump past the meta-information with one find for the #CHROM column line
+    text = ''
+    while True:
+        block = lines.read(VCF_HEADER_BLOCK_CHARS)
+        text += block
+        chrom_line = 0 if text.startswith('#CHROM') else (text.find('\n#CHROM') + 1 or -1)
+        if chrom_line != -1:
+            header_end = text.find('\n', chrom_line)
+            if header_end != -1:
+                return text[header_end + 1:]
+        if not block:
+            break
     
-    # Common disease-associated loci
-    disease_loci = {
-        "cardiovascular_disease": [
-            {"chr": "1", "pos": 55505647},  # PCSK9
-            {"chr": "2", "pos": 21286757},  # APOB
-            {"chr": "19", "pos": 11217748}, # LDLR
-        ],
-        "diabetes_type2": [
-            {"chr": "6", "pos": 20679709},  # HLA region
-            {"chr": "10", "pos": 94452862}, # TCF7L2
-            {"chr": "11", "pos": 2161612},  # INS
-        ],
-        "alzheimer_disease": [
-            {"chr": "19", "pos": 45411941}, # APOE
-            {"chr": "11", "pos": 59923508}, # MS4A6A
-            {"chr": "2", "pos": 127892810}, # BIN1
-        ]
-    }
-    
-    for prs in prs_scores:
-        disease_key = prs.disease_type.lower().replace(" ", "_")
-        if disease_key in disease_loci:
-            for locus in disease_loci[disease_key]:
-                variants.append({
-                    "chromosome": locus["chr"],
-                    "position": locus["pos"],
-                    "importance": min(prs.score, 1.0),  # Use PRS score as importance
-                    "id": f"{locus['chr']}:{locus['pos']}",
-                    "ref": "G",  # Placeholder
-                    "alt": "A",  # Placeholder
-                    "quality": 60.0
-                })
+    # No complete #CHROM line: drop any leading '#'/blank lines from the (whole) file
+    data = text.splitlines(keepends=True)
+    first = next((i for i, line in enumerate(data) if line.strip() and not line.startswith('#')), len(data))
+    return ''.join(data[first:])
+
+class _VCFDataText:
+    """
+    Read-only text stream over VCF data lines: already-read text followed by the rest of an
+    open stream, with every line padded by empty fields so it has at least the fixed columns
+    (read_csv's usecols rejects a chunk whose rows are all short; _score_vcf_records drops them)
+    """
     
-    return variants
+    def __init__(self, head: str, rest: TextIO):
+        self._head = head
+        self._rest = rest
+        self._padded_last_line = False
+    
+    def read(self, size: int = -1) -> str:
+        if not self._head:
+            text = self._rest.read(size)
+        elif size is None or size < 0:
+            text, self._head = self._head + self._rest.read(), ''
+        else:
+            text, self._head = self._head[:size], self._head[size:]
+        
+        if not text:
+            # Pad a final line without a trailing newline (or add one all-empty row, dropped later)
+            if self._padded_last_line:
+                return ''
+            self._padded_last_line = True
+            return _VCF_ROW_PAD
+        return text.replace('\n', _VCF_ROW_PAD + '\n')
+
+def _read_vcf_records(source: TextIO, **kwargs):
+    """read_csv over VCF data lines as string columns"""
+    return pd.read_csv(
+        source,
+        sep='\t',
+        header=None,
+        names=_VCF_COLUMNS,
+        usecols=range(len(_VCF_COLUMNS)),
+        index_col=False,
+        quoting=csv.QUOTE_NONE,
+        dtype=str,
+        keep_default_na=False,
+        **kwargs
+    )
 
-def calculate_variant_importance(qual: float, info: str, chrom: str, pos: int) -> float:
-    """Calculate variant importance score (0-1)"""
-    importance = 0.0
+def _score_vcf_records(df: pd.DataFrame) -> List[dict]:
+    """Validate parsed VCF records and attach importance scores"""
+    # Drop short records and records with a non-numeric POS/QUAL
+    pos = pd.to_numeric(df["pos"], errors="coerce")
+    qual = pd.to_numeric(df["qual"].replace(".", "0"), errors="coerce")
+    valid = (df["info"] != "") & pos.notna() & qual.notna()
+    df = df[valid]
+    if df.empty:
+        return []
+    pos = pos[valid].astype(np.int64).to_numpy()
+    qual = qual[valid].astype(np.float64).to_numpy()
+    chrom_clean = df["chrom"].str.replace(_CHR_PREFIX, '', regex=True).to_numpy()
     
-    # Base score from quality
-    if qual > 0:
-        importance += min(qual / 100.0, 0.5)  # Max 0.5 from quality
+    variants = pd.DataFrame({
+        "chromosome": chrom_clean,
+        "position": pos,
+        "importance": calculate_variant_importance_batch(qual, chrom_clean, pos),
+        "id": np.where(df["id"] == ".", df["chrom"] + ":" + df["pos"], df["id"]),
+        "ref": df["ref"].to_numpy(),
+        "alt": df["alt"].to_numpy(),
+        "quality": qual
+    })
     
-    # Boost for known important regions
-    important_regions = {
-        "19": [11200000, 11250000],  # LDLR region
-        "19": [45400000, 45450000],  # APOE region
-        "6": [20600000, 20700000],   # HLA region
-    }
+    # Plain dicts only at the API boundary
+    return variants.to_dict("records")
+
+def generate_representative_variants(prs_scores: List[PrsScore]) -> List[dict]:
+    """Generate representative variants based on PRS scores"""
+    return [
+        {
+            "chromosome": locus["chr"],
+            "position": locus["pos"],
+            "importance": min(prs.score, 1.0),  # Use PRS score as importance
+            "id": locus["id"],
+            "ref": "G",  # Placeholder
+            "alt": "A",  # Placeholder
+            "quality": 60.0
+        }
+        for prs in prs_scores
+        for locus in _DISEASE_LOCI.get(_disease_key(prs.disease_type), ())
+    ]
+
+def calculate_variant_importance_batch(qual: np.ndarray, chrom_clean: np.ndarray, pos: np.ndarray) -> np.ndarray:
+    """Variant importance scores (0-1) over cleaned chromosome/position arrays"""
+    # Base score from quality (max 0.5)
+    importance = np.where(qual > 0, np.minimum(qual / 100.0, 0.5), 0.0)
     
-    chrom_clean = clean_chromosome(chrom)
-    if chrom_clean in important_regions:
-        for start, end in [important_regions[chrom_clean]]:
-            if start <= pos <= end:
-                importance += 0.3
-                break
+    # Boost for known important regions
+    in_region = np.zeros(len(pos), dtype=bool)
+    for chrom, (starts, ends) in _REGION_BOUNDS.items():
+        on_chrom = chrom_clean == chrom
+        chrom_pos = pos[on_chrom]
+        idx = np.searchsorted(starts, chrom_pos, side='right') - 1
+        in_region[on_chrom] = (idx >= 0) & (chrom_pos <= ends[np.maximum(idx, 0)])
+    importance += np.where(in_region, 0.3, 0.0)
     
     # Random component for demo purposes
-    import random
-    importance += random.uniform(0.0, 0.2)
+    importance += _NP_RNG.uniform(0.0, 0.2, len(pos))
     
-    return min(importance, 1.0)
+    return np.minimum(importance, 1.0)
 
+@lru_cache(maxsize=64)
 def clean_chromosome(chrom: str) -> str:
     """Clean chromosome name"""
-    chrom = chrom.replace('chr', '').replace('CHR', '')
-    return chrom
+    return _CHR_PREFIX.sub('', chrom)
+
+def variant_sort_key(variant: dict) -> tuple:
+    """Sort key for a variant: chromosome order, then position"""
+    return (chromosome_sort_key(variant['chromosome']), variant['position'])
 
+@lru_cache(maxsize=64)
 def chromosome_sort_key(chrom: str) -> tuple:
     """Create sort key for chromosomes"""
     chrom_clean = clean_chromosome(chrom)
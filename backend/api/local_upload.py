@@ -1,11 +1,12 @@
 import os
 import uuid
 import logging
-import json
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, BackgroundTasks
+import aiofiles
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Form, BackgroundTasks, Query
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from sqlalchemy.sql import func
-from typing import List
+from typing import List, Optional
 
 from core.auth import get_current_active_patient
 from db.database import get_db
@@ -13,7 +14,7 @@ from db.models import GenomicData, PrsScore
 from db.auth_models import User
 from schemas.schemas import GenomicDataResponse, UploadResponse
 from services.report_generator import ReportGenerator
-from genomic_utils import GenomicProcessor
+from genomic_utils import get_genomic_processor
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/local-upload", tags=["local-upload"])
@@ -22,8 +23,24 @@ router = APIRouter(prefix="/api/local-upload", tags=["local-upload"])
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# Allowed genomic file types (tuple so one str.endswith call checks them all)
+ALLOWED_EXTENSIONS = ('.vcf', '.fastq', '.fq', '.vcf.gz', '.fastq.gz')
+
+# Chunk size for streaming uploads to disk
+COPY_CHUNK_SIZE = 1024 * 1024
+
+async def _save_upload(file: UploadFile, file_path: str) -> int:
+    """Stream an upload to disk in chunks without blocking the event loop; returns its size in bytes"""
+    file_size = 0
+    await file.seek(0)
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await file.read(COPY_CHUNK_SIZE):
+            await f.write(chunk)
+            file_size += len(chunk)
+    return file_size
+
 # Background task for processing genomic data
-def process_genomic_data_background(genomic_data_id: int, file_path: str, file_content: bytes, filename: str):
+def process_genomic_data_background(genomic_data_id: int, file_path: str, filename: str):
     """Background task to process genomic data and generate reports"""
     from db.database import SessionLocal  # Import inside function to avoid circular imports
     
@@ -39,8 +56,9 @@ def process_genomic_data_background(genomic_data_id: int, file_path: str, file_c
             db.commit()
         
         # Process genomic file for detailed analysis
-        processor = GenomicProcessor()
-        analysis_result = processor.process_genomic_file(file_content, filename)
+        # Read the saved upload only now, rather than holding its bytes while the task is queued
+        with open(file_path, "rb") as fh:
+            analysis_result = get_genomic_processor().process_genomic_file(fh, filename)
         
         # Calculate real PRS scores if VCF file
         prs_scores_data = []
@@ -68,14 +86,12 @@ def process_genomic_data_background(genomic_data_id: int, file_path: str, file_c
                 {"disease_type": "general_health_assessment", "score": 0.5}
             ]
         
-        # Save PRS scores to database
-        for prs_data in prs_scores_data:
-            prs_score = PrsScore(
-                genomic_data_id=genomic_data_id,
-                disease_type=prs_data["disease_type"],
-                score=prs_data["score"]
+        # Save PRS scores to database in one multi-row INSERT
+        if prs_scores_data:
+            db.execute(
+                insert(PrsScore),
+                [{"genomic_data_id": genomic_data_id, **prs_data} for prs_data in prs_scores_data]
             )
-            db.add(prs_score)
         
         # Update genomic data status to completed
         if genomic_record:
@@ -109,11 +125,10 @@ async def upload_genomic_file_authenticated(
     """
     try:
         # Validate file type
-        allowed_extensions = ['.vcf', '.fastq', '.fq', '.vcf.gz', '.fastq.gz']
-        if not any(file.filename.lower().endswith(ext.lower()) for ext in allowed_extensions):
+        if not file.filename.lower().endswith(ALLOWED_EXTENSIONS):
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+                detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
         # Generate unique filename
@@ -123,13 +138,9 @@ async def upload_genomic_file_authenticated(
         
         logger.info(f"Starting authenticated upload for user {current_user.id}, file: {file.filename}")
         
-        # Save file locally
+        # Save file locally, streaming off the event loop
         try:
-            file_content = await file.read()
-            with open(file_path, "wb") as f:
-                f.write(file_content)
-            
-            file_size = len(file_content)
+            file_size = await _save_upload(file, file_path)
             logger.info(f"Successfully saved {file.filename} locally: {file_path}")
         except Exception as e:
             logger.error(f"Failed to save file locally: {e}")
@@ -141,11 +152,11 @@ async def upload_genomic_file_authenticated(
             filename=file.filename,
             file_url=file_path,
             status="processing",  # Set to processing initially
-            metadata_json=json.dumps({
+            metadata_json={
                 "file_size_bytes": file_size,
                 "local_path": file_path,
                 "upload_method": "local_authenticated"
-            })
+            }
         )
         
         db.add(genomic_data)
@@ -157,7 +168,6 @@ async def upload_genomic_file_authenticated(
             process_genomic_data_background,
             genomic_data.id,
             file_path,
-            file_content,
             file.filename
         )
         
@@ -176,10 +186,17 @@ async def upload_genomic_file_authenticated(
         raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
 
 @router.get("/genomic-data/user/{user_id}", response_model=List[GenomicDataResponse])
-def get_user_genomic_data_local(user_id: str, db: Session = Depends(get_db)):
-    """Get all genomic data records for a user"""
-    genomic_data = db.query(GenomicData).filter(GenomicData.user_id == user_id).all()
-    return genomic_data
+def get_user_genomic_data_local(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get a user's genomic data records, newest first; pass the last id as cursor for the next page"""
+    query = db.query(GenomicData).filter(GenomicData.user_id == user_id)
+    if cursor is not None:
+        query = query.filter(GenomicData.id < cursor)
+    return query.order_by(GenomicData.id.desc()).limit(limit).all()
 
 @router.post("/genomic-data-test", status_code=202)
 async def upload_genomic_file_test(
@@ -191,11 +208,10 @@ async def upload_genomic_file_test(
     """
     try:
         # Validate file type
-        allowed_extensions = ['.vcf', '.fastq', '.fq', '.vcf.gz', '.fastq.gz']
-        if not any(file.filename.lower().endswith(ext.lower()) for ext in allowed_extensions):
+        if not file.filename.lower().endswith(ALLOWED_EXTENSIONS):
             raise HTTPException(
                 status_code=400,
-                detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
+                detail=f"Unsupported file type. Allowed: {', '.join(ALLOWED_EXTENSIONS)}"
             )
         
         # Generate unique filename
@@ -205,13 +221,9 @@ async def upload_genomic_file_test(
         
         logger.info(f"Starting test upload for user {user_id}, file: {file.filename}")
         
-        # Save file locally
+        # Save file locally, streaming off the event loop
         try:
-            file_content = await file.read()
-            with open(file_path, "wb") as f:
-                f.write(file_content)
-            
-            file_size = len(file_content)
+            file_size = await _save_upload(file, file_path)
             logger.info(f"Successfully saved {file.filename} locally: {file_path}")
         except Exception as e:
             logger.error(f"Failed to save file locally: {e}")
@@ -1,34 +1,70 @@
 import logging
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import numpy as np
 from PIL import Image
 import io
+from botocore.exceptions import ClientError
 
 from db.database import get_db
 from db.models import MlPrediction
-from schemas.schemas import MlPredictionResponse, MlInferenceRequest
+from schemas.schemas import ClinicalData, MlPredictionResponse, MlInferenceRequest
+from core.config import settings
+from core.storage import s3_client
 from cg_worker.tasks import run_ml_inference, run_brain_tumor_inference
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/ml", tags=["ml"])
 
+# Input size of the brain tumor classifier run by the worker
+BRAIN_TUMOR_INPUT_SIZE = (150, 150)
+
+def _encode_brain_tumor_input(src) -> bytes:
+    """Decode and resize an uploaded image once; returns the (150, 150, 3) uint8 array as .npy bytes"""
+    image = Image.open(src).convert('RGB').resize(BRAIN_TUMOR_INPUT_SIZE)
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(image, dtype=np.uint8))
+    return buffer.getvalue()
+
 @router.post("/predict-brain-tumor", status_code=202)
 async def predict_brain_tumor(file: UploadFile = File(...)):
     """
     Trigger brain tumor prediction from an uploaded MRI scan.
     """
-    contents = await file.read()
-    
     # Basic validation for image file
-    if not contents:
+    file.file.seek(0, 2)
+    if not file.file.tell():
         raise HTTPException(status_code=400, detail="Empty file uploaded")
+    file.file.seek(0)
     if not file.content_type.startswith("image/"):
         raise HTTPException(status_code=400, detail="File is not an image")
-
+    
+    # Decode here so malformed images fail fast and the worker skips the decode
+    try:
+        model_input = await run_in_threadpool(_encode_brain_tumor_input, file.file)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid image file: {str(e)}")
+    
+    # Stage the model-ready array in S3 and queue the task with its key; the Celery message stays tiny
+    s3_key = f"ml/brain-tumor/{uuid.uuid4()}.npy"
+    try:
+        await run_in_threadpool(
+            s3_client.put_object,
+            Bucket=settings.s3_bucket_name,
+            Key=s3_key,
+            Body=model_input,
+            ContentType="application/octet-stream"
+        )
+    except ClientError as e:
+        logger.error(f"Failed to stage image in S3: {e}")
+        raise HTTPException(status_code=500, detail="Failed to upload file to storage")
+    
     # Queue the inference task
-    run_brain_tumor_inference.delay(list(contents))
+    run_brain_tumor_inference.delay(s3_key)
     
     return {
         "message": "Brain tumor prediction started",
@@ -44,41 +80,22 @@ async def trigger_ml_prediction(
     Trigger ML model inference
     Returns immediately and processes in background
     """
+    # Validate clinical data fields and ranges
     try:
-        # Validate clinical data
-        required_fields = ["age", "bmi", "glucose_level", "blood_pressure"]
-        missing_fields = [field for field in required_fields if field not in request.clinical_data]
-        
+        clinical_data = ClinicalData.model_validate(request.clinical_data)
+    except ValidationError as e:
+        missing_fields = [str(err["loc"][0]) for err in e.errors() if err["type"] == "missing"]
         if missing_fields:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Missing required clinical data fields: {', '.join(missing_fields)}"
+            detail = f"Missing required clinical data fields: {', '.join(missing_fields)}"
+        else:
+            detail = "Invalid clinical data: " + "; ".join(
+                f"{err['loc'][0]}: {err['msg']}" for err in e.errors()
             )
-        
-        # Validate data types and ranges
-        try:
-            age = float(request.clinical_data["age"])
-            bmi = float(request.clinical_data["bmi"])
-            glucose = float(request.clinical_data["glucose_level"])
-            bp = float(request.clinical_data["blood_pressure"])
-            
-            if not (0 < age < 150):
-                raise ValueError("Age must be between 0 and 150")
-            if not (10 < bmi < 60):
-                raise ValueError("BMI must be between 10 and 60")
-            if not (50 < glucose < 500):
-                raise ValueError("Glucose level must be between 50 and 500")
-            if not (60 < bp < 250):
-                raise ValueError("Blood pressure must be between 60 and 250")
-                
-        except (ValueError, TypeError) as e:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid clinical data: {str(e)}"
-            )
-        
+        raise HTTPException(status_code=400, detail=detail)
+    
+    try:
         # Queue ML inference task
-        run_ml_inference.delay(request.user_id, request.clinical_data)
+        run_ml_inference.delay(request.user_id, clinical_data.model_dump())
         
         logger.info(f"Queued ML inference for user: {request.user_id}")
         
@@ -88,17 +105,22 @@ async def trigger_ml_prediction(
             "user_id": request.user_id
         }
         
-    except HTTPException:
-        raise
     except Exception as e:
         logger.error(f"Error triggering ML prediction: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @router.get("/predictions/user/{user_id}", response_model=List[MlPredictionResponse])
-def get_user_predictions(user_id: str, db: Session = Depends(get_db)):
-    """Get all ML predictions for a user"""
-    predictions = db.query(MlPrediction).filter(MlPrediction.user_id == user_id).all()
-    return predictions
+def get_user_predictions(
+    user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = None,
+    db: Session = Depends(get_db)
+):
+    """Get a user's ML predictions, newest first; pass the last id as cursor for the next page"""
+    query = db.query(MlPrediction).filter(MlPrediction.user_id == user_id)
+    if cursor is not None:
+        query = query.filter(MlPrediction.id < cursor)
+    return query.order_by(MlPrediction.id.desc()).limit(limit).all()
 
 @router.get("/predictions/{prediction_id}", response_model=MlPredictionResponse)
 def get_prediction(prediction_id: int, db: Session = Depends(get_db)):
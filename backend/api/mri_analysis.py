@@ -1,24 +1,35 @@
 import os
 import uuid
 import json
+import orjson
 import logging
 import time
+import hashlib
+import hmac
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import aiofiles
 import numpy as np
+from collections import defaultdict
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, StreamingResponse
-from sqlalchemy.orm import Session
+from functools import lru_cache, partial
+from cachetools import TTLCache
+from typing import List, Optional, Dict, Any, Union, BinaryIO, Tuple
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, load_only
 from sqlalchemy.sql import func
-from PIL import Image, ImageEnhance, ImageOps, ImageFilter, ImageDraw, ImageFont, ImageColor
+from PIL import Image, ImageEnhance, ImageOps, ImageDraw, ImageFont, ImageColor, UnidentifiedImageError
 import io
-import base64
 
 from core.auth import get_current_active_patient
+from core.config import settings
 from db.database import get_db
 from db.models import MRIAnalysis
 from db.auth_models import User as AuthUser
-from schemas.schemas import MRIAnalysisResponse, MRIUploadResponse
+from schemas.schemas import MRIAnalysisResponse, MRIAnalysisSummaryResponse, MRIUploadResponse
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/mri", tags=["mri-analysis"])
@@ -27,30 +38,188 @@ router = APIRouter(prefix="/api/mri", tags=["mri-analysis"])
 MRI_UPLOAD_DIR = "uploads/mri"
 os.makedirs(MRI_UPLOAD_DIR, exist_ok=True)
 
+# Long-lived processes for CPU-bound analysis, created on first upload (not at import)
+MRI_ANALYSIS_WORKERS = int(os.getenv("MRI_ANALYSIS_WORKERS", "2"))
+_analysis_executor: Optional[ProcessPoolExecutor] = None
+
+def _init_analysis_worker():
+    """Load the image-processing stack and compile the window kernel once per worker process"""
+    logging.basicConfig(level=logging.INFO)
+    import cv2  # noqa: F401
+    from scipy import ndimage  # noqa: F401
+    from api.mri_kernels import window_stats
+    window_stats(np.zeros((32, 32), dtype=np.uint8), np.ones((32, 32), dtype=bool),
+                 np.arange(0, 16, 8), np.arange(0, 16, 8), 16)
+
+def get_analysis_executor() -> ProcessPoolExecutor:
+    """Shared analysis pool; spawned workers avoid forking the server's threads"""
+    global _analysis_executor
+    if _analysis_executor is None:
+        _analysis_executor = ProcessPoolExecutor(
+            max_workers=MRI_ANALYSIS_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_analysis_worker,
+        )
+    return _analysis_executor
+
+def shutdown_analysis_executor():
+    """Stop the analysis pool, letting queued analyses finish"""
+    global _analysis_executor
+    if _analysis_executor is not None:
+        _analysis_executor.shutdown(wait=True)
+        _analysis_executor = None
+
+def _analysis_finished(analysis_id: int, future: Future):
+    """Pool callback: a worker that died mid-analysis (OOM, native crash) never updates its row"""
+    error = future.exception()
+    if error is None:
+        return
+    logger.error(f"❌ MRI analysis {analysis_id} worker failed: {error!r}")
+    from db.database import SessionLocal
+    db = SessionLocal()
+    try:
+        db.query(MRIAnalysis).filter(
+            MRIAnalysis.id == analysis_id,
+            MRIAnalysis.status.in_(("processing", "analyzing"))
+        ).update({
+            "status": "failed",
+            "error_message": f"Processing failed: analysis worker stopped ({type(error).__name__})",
+            "analysis_completed_at": func.now()
+        }, synchronize_session=False)
+        db.commit()
+    except Exception as db_error:
+        logger.error(f"❌ Failed to update database with error status: {db_error}")
+    finally:
+        db.close()
+
+def submit_mri_analysis(analysis_id: int, file_path: str):
+    """Queue process_mri_analysis_background on the pool, replacing the pool if a crashed worker broke it"""
+    global _analysis_executor
+    try:
+        future = get_analysis_executor().submit(process_mri_analysis_background, analysis_id, file_path)
+    except BrokenProcessPool:
+        logger.error("❌ MRI analysis pool is broken, starting a new one")
+        _analysis_executor.shutdown(wait=False)
+        _analysis_executor = None
+        future = get_analysis_executor().submit(process_mri_analysis_background, analysis_id, file_path)
+    future.add_done_callback(partial(_analysis_finished, analysis_id))
+
+# Uploads are streamed to disk in chunks of this size rather than read whole
+COPY_CHUNK_SIZE = 1024 * 1024
+
+async def _save_upload(file: UploadFile, file_path: str) -> Tuple[int, str]:
+    """Stream an upload to disk in chunks; returns its size in bytes and SHA-256 hex digest"""
+    file_size = 0
+    digest = hashlib.sha256()
+    await file.seek(0)
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await file.read(COPY_CHUNK_SIZE):
+            await f.write(chunk)
+            digest.update(chunk)
+            file_size += len(chunk)
+    return file_size, digest.hexdigest()
+
+def _hash_upload(file: UploadFile) -> Tuple[int, str]:
+    """Size and SHA-256 hex digest of a spooled upload, read in chunks; leaves it rewound"""
+    file_size = 0
+    digest = hashlib.sha256()
+    file.file.seek(0)
+    while chunk := file.file.read(COPY_CHUNK_SIZE):
+        digest.update(chunk)
+        file_size += len(chunk)
+    file.file.seek(0)
+    return file_size, digest.hexdigest()
+
+# Results for identical uploads (retries, re-tests), keyed by content hash
+_validation_cache = TTLCache(maxsize=1024, ttl=24 * 3600)
+ANALYSIS_CACHE_TTL = 24 * 3600
+_analysis_cache = TTLCache(maxsize=256, ttl=ANALYSIS_CACHE_TTL)
+
+# Annotated overlays live exactly as long as the cached analysis linking to them:
+# their URLs are signed to expire with it, and expired files are swept from disk
+_last_annotation_sweep = 0.0
+
+def _annotation_signature(annotation_id: str, expires: int) -> str:
+    message = f"{annotation_id}:{expires}".encode()
+    return hmac.new(settings.secret_key.encode(), message, hashlib.sha256).hexdigest()
+
+def _annotation_url(annotation_id: str) -> str:
+    """Signed, expiring URL for an overlay; <img> tags cannot send the bearer token"""
+    expires = int(time.time()) + ANALYSIS_CACHE_TTL
+    return f"{router.prefix}/annotated/{annotation_id}.webp?expires={expires}&sig={_annotation_signature(annotation_id, expires)}"
+
+def _sweep_expired_annotations():
+    """Delete overlays older than ANALYSIS_CACHE_TTL; runs at most hourly"""
+    global _last_annotation_sweep
+    now = time.time()
+    if now - _last_annotation_sweep < 3600:
+        return
+    _last_annotation_sweep = now
+    with os.scandir(MRI_UPLOAD_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith("_annotated.webp") and entry.stat().st_mtime < now - ANALYSIS_CACHE_TTL:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+
+def _validate_cached(file_sha256: str, source: Union[str, BinaryIO], filename: str) -> Dict[str, Any]:
+    """MRIProcessor.validate_mri_image, memoized by content hash and filename"""
+    key = (file_sha256, filename)
+    validation_result = _validation_cache.get(key)
+    if validation_result is None:
+        validation_result = _validation_cache[key] = MRIProcessor.validate_mri_image(source, filename)
+    return validation_result
+
+def _image_info(source: BinaryIO) -> Dict[str, Any]:
+    """Format, size and mode from an image header, without decoding pixels"""
+    with Image.open(source) as image:
+        return {"format": image.format, "size": image.size, "mode": image.mode}
+
+def _upload_size(file: UploadFile) -> int:
+    """Size of a spooled upload without reading it into memory"""
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
 # MRI processing utilities
 class MRIProcessor:
     """Handle MRI image processing and analysis"""
     
     @staticmethod
-    def validate_mri_image(file_content: bytes, filename: str) -> Dict[str, Any]:
-        """Validate uploaded MRI image"""
+    def validate_mri_image(source: Union[bytes, str, BinaryIO], filename: str) -> Dict[str, Any]:
+        """Validate uploaded MRI image from its bytes, a saved path or an open file (header only)"""
         try:
-            # Try to open the image
-            image = Image.open(io.BytesIO(file_content))
+            if isinstance(source, bytes):
+                file_size = len(source)
+                source = io.BytesIO(source)
+            elif isinstance(source, str):
+                file_size = os.path.getsize(source)
+            else:
+                source.seek(0, os.SEEK_END)
+                file_size = source.tell()
+                source.seek(0)
+            
+            # Try to open the image; PIL only parses the header until pixels are needed
+            with Image.open(source) as image:
+                image_format, image_size, image_mode = image.format, image.size, image.mode
+            if not isinstance(source, str):
+                source.seek(0)
             
             # Basic validation
             validation_result = {
                 "valid": True,
-                "format": image.format,
-                "size": image.size,
-                "mode": image.mode,
-                "file_size": len(file_content),
-                "is_grayscale": image.mode in ['L', 'LA'],
+                "format": image_format,
+                "size": image_size,
+                "mode": image_mode,
+                "file_size": file_size,
+                "is_grayscale": image_mode in ['L', 'LA'],
                 "estimated_type": "brain_scan" if any(term in filename.lower() for term in ['brain', 'head', 'mri', 'scan']) else "medical_image"
             }
             
             # Check if image dimensions are reasonable for MRI
-            width, height = image.size
+            width, height = image_size
             if width < 50 or height < 50:
                 validation_result["valid"] = False
                 validation_result["error"] = "Image dimensions too small for MRI analysis"
@@ -59,185 +228,262 @@ class MRIProcessor:
             
             return validation_result
             
+        except UnidentifiedImageError:
+            return {
+                "valid": False,
+                "error": "Invalid image file: unrecognized image format"
+            }
         except Exception as e:
             return {
                 "valid": False,
                 "error": f"Invalid image file: {str(e)}"
             }
 
-def analyze_mri_image_real(image: Image.Image) -> dict:
+def prepare_mri_array(image: Image.Image) -> np.ndarray:
+    """Grayscale, Gaussian-blurred uint8 array as analyzed by analyze_mri_image_real"""
+    import cv2
+    
+    # Convert to grayscale and normalize
+    if image.mode not in ('L', 'RGB', 'RGBA'):
+        image = image.convert('L')
+    arr = np.asarray(image, dtype=np.uint8)
+    if arr.ndim == 3:
+        arr = cv2.cvtColor(arr, cv2.COLOR_RGBA2GRAY if arr.shape[2] == 4 else cv2.COLOR_RGB2GRAY)
+    
+    # Apply smoothing to reduce noise; pixels stay uint8, statistics are scaled to [0, 1] later
+    return cv2.GaussianBlur(arr, (0, 0), sigmaX=1.0)
+
+def _brain_statistics(img_array: np.ndarray) -> Tuple[np.ndarray, int, float, float]:
+    """Otsu brain mask (0/1 uint8), its area, and the brain's mean/std intensity in [0, 1]"""
+    import cv2
+    from api.mri_kernels import scratch
+    
+    # Find brain region with an Otsu threshold (0/1 mask, so it views as bool)
+    _, brain_mask_u8 = cv2.threshold(img_array, 0, 1, cv2.THRESH_BINARY + cv2.THRESH_OTSU,
+                                     dst=scratch('brain_mask', img_array.shape, np.uint8))
+    brain_area = cv2.countNonZero(brain_mask_u8)
+    
+    if brain_area == 0:
+        logger.warning("   - No brain tissue detected, using whole image")
+        brain_mask_u8 = np.ones_like(img_array)
+        brain_area = brain_mask_u8.size
+    
+    # Masked mean/std in one pass, scaled to [0, 1] intensities
+    brain_mean_arr, brain_std_arr = cv2.meanStdDev(img_array, mask=brain_mask_u8)
+    return brain_mask_u8, brain_area, float(brain_mean_arr[0, 0]) / 255.0, float(brain_std_arr[0, 0]) / 255.0
+
+def _classify_windows(count: np.ndarray, win_mean: np.ndarray, win_std: np.ndarray, window_size: int,
+                      brain_mean: float, brain_std: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Anomaly candidates and their confidence on the window grid (window mean/std in [0, 1])"""
+    # Only analyze windows that are mostly within brain region
+    in_brain = count >= (window_size * window_size * 0.5)
+    
+    # Check for anomalies
+    is_bright = win_mean > brain_mean + 2.0 * brain_std
+    is_dark = (win_mean < brain_mean - 1.5 * brain_std) & (win_mean > brain_mean * 0.3)
+    is_textural = win_std > brain_std * 2.0
+    
+    # Calculate confidence
+    intensity_diff = np.abs(win_mean - brain_mean) / brain_std
+    texture_diff = np.abs(win_std - brain_std) / brain_std
+    conf_grid = np.clip((intensity_diff + texture_diff) / 5.0, 0.5, 0.95)
+    return in_brain & (is_bright | is_dark | is_textural), conf_grid
+
+def _cluster_reach(radius: int, step_size: int) -> np.ndarray:
+    """Window-grid offsets within `radius` pixels, i.e. which windows one seed can cluster with"""
+    r = radius // step_size
+    dy, dx = np.mgrid[-r:r + 1, -r:r + 1] * step_size
+    return dy ** 2 + dx ** 2 <= radius ** 2
+
+def _cluster_windows(xs: np.ndarray, ys: np.ndarray, radius: int) -> List[np.ndarray]:
+    """
+    Greedy clustering: each unassigned window (in order) seeds a cluster of every
+    unassigned window within `radius` of it. Candidates come from a grid of
+    radius-sized cells, so only the seed's 3x3 neighbouring cells are checked.
+    Returns index arrays with the seed first.
+    """
+    grid = defaultdict(list)
+    cells_x = xs // radius
+    cells_y = ys // radius
+    for idx, cell in enumerate(zip(cells_x.tolist(), cells_y.tolist())):
+        grid[cell].append(idx)
+    
+    x_list, y_list = xs.tolist(), ys.tolist()
+    radius_sq = radius * radius
+    used = [False] * len(x_list)
+    clusters = []
+    for i, (cx, cy) in enumerate(zip(cells_x.tolist(), cells_y.tolist())):
+        if used[i]:
+            continue
+        used[i] = True
+        members = [i]
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for j in grid.get((gx, gy), ()):
+                    if not used[j] and (x_list[i] - x_list[j]) ** 2 + (y_list[i] - y_list[j]) ** 2 <= radius_sq:
+                        used[j] = True
+                        members.append(j)
+        clusters.append(np.array(members))
+    return clusters
+
+def analyze_mri_image_real(image: Union[Image.Image, np.ndarray], window_size: int = 16, step_size: int = 8,
+                           rois: Optional[List[tuple]] = None) -> dict:
     """
     Real MRI analysis using actual image processing
-    Instead of random tumor generation, this analyzes the actual image pixels
+    Instead of random tumor generation, this analyzes the actual image pixels.
+    `image` may also be an array already produced by prepare_mri_array.
+    When `rois` ((x0, y0, x1, y1) boxes) is given, scanning starts inside them and grows
+    until every window cluster reaching them is complete; other windows are skipped.
     """
+    # Heavy image-processing deps load on first analysis, not at router import
+    import cv2
+    from scipy import ndimage
+    from api.mri_kernels import scratch, window_stats
+    
     try:
         logger.info("🔍 Starting REAL image-based MRI analysis")
         
-        # Convert to grayscale and normalize
-        if image.mode != 'L':
-            image = image.convert('L')
-        
-        # Apply smoothing to reduce noise
-        image = image.filter(ImageFilter.GaussianBlur(radius=1))
-        img_array = np.array(image, dtype=np.float32) / 255.0
+        # Grayscale and blur unless the caller already did; float input in [0, 1] is requantized
+        img_array = image if isinstance(image, np.ndarray) else prepare_mri_array(image)
+        if img_array.dtype != np.uint8:
+            img_array = cv2.convertScaleAbs(img_array, dst=scratch('img_u8', img_array.shape, np.uint8), alpha=255.0)
         
         logger.info(f"   - Image processed: {img_array.shape} pixels")
         
-        # Find brain region using simple thresholding
-        img_mean = np.mean(img_array)
-        img_std = np.std(img_array)
-        threshold = img_mean + 0.3 * img_std
-        brain_mask = img_array > threshold
-        
-        if np.sum(brain_mask) == 0:
-            logger.warning("   - No brain tissue detected, using whole image")
-            brain_mask = np.ones_like(img_array, dtype=bool)
-        
-        brain_pixels = img_array[brain_mask]
-        brain_mean = np.mean(brain_pixels)
-        brain_std = np.std(brain_pixels)
+        # Brain tissue mask and intensity statistics
+        brain_mask_u8, brain_area, brain_mean, brain_std = _brain_statistics(img_array)
+        brain_mask = brain_mask_u8.view(bool)
         
         logger.info(f"   - Brain tissue stats: mean={brain_mean:.3f}, std={brain_std:.3f}")
         
         # Detect anomalous regions using sliding window
         tumor_regions = []
-        window_size = 16
-        step_size = 8
-        
-        # Thresholds for anomaly detection
-        bright_threshold = brain_mean + 2.0 * brain_std
-        dark_threshold = brain_mean - 1.5 * brain_std
-        texture_threshold = brain_std * 2.0
         
-        potential_anomalies = []
-        
-        for y in range(0, img_array.shape[0] - window_size, step_size):
-            for x in range(0, img_array.shape[1] - window_size, step_size):
-                window = img_array[y:y+window_size, x:x+window_size]
-                window_mask = brain_mask[y:y+window_size, x:x+window_size]
-                
-                # Only analyze windows that are mostly within brain region
-                if np.sum(window_mask) < (window_size * window_size * 0.5):
-                    continue
-                
-                window_mean = np.mean(window[window_mask])
-                window_std = np.std(window[window_mask])
-                
-                # Check for anomalies
-                is_bright = window_mean > bright_threshold
-                is_dark = window_mean < dark_threshold and window_mean > brain_mean * 0.3
-                is_textural = window_std > texture_threshold
-                
-                if is_bright or is_dark or is_textural:
-                    # Calculate confidence
-                    intensity_diff = abs(window_mean - brain_mean) / brain_std
-                    texture_diff = abs(window_std - brain_std) / brain_std
-                    confidence = min(0.95, max(0.5, (intensity_diff + texture_diff) / 5.0))
-                    
-                    anomaly_type = 'bright' if is_bright else 'dark' if is_dark else 'textural'
-                    
-                    potential_anomalies.append({
-                        'x': x, 'y': y, 
-                        'mean': window_mean, 'std': window_std,
-                        'confidence': confidence, 'type': anomaly_type
-                    })
-        
-        logger.info(f"   - Found {len(potential_anomalies)} potential anomalous windows")
+        # Per-window statistics over brain pixels for every window at once
+        ys = np.arange(0, img_array.shape[0] - window_size, step_size)
+        xs = np.arange(0, img_array.shape[1] - window_size, step_size)
+        if rois is None:
+            count, win_mean, win_std = window_stats(img_array, brain_mask, ys, xs, window_size)
+            win_mean /= 255.0
+            win_std /= 255.0
+            anomaly_grid, conf_grid = _classify_windows(count, win_mean, win_std, window_size, brain_mean, brain_std)
+        else:
+            # Windows never scanned keep a zero count and never become candidates
+            count = np.zeros((ys.size, xs.size))
+            win_mean = np.zeros_like(count)
+            win_std = np.zeros_like(count)
+            scanned = np.zeros(count.shape, dtype=bool)
+            
+            def scan(rows: slice, cols: slice):
+                count[rows, cols], mean, std = window_stats(img_array, brain_mask, ys[rows], xs[cols], window_size)
+                win_mean[rows, cols] = mean / 255.0
+                win_std[rows, cols] = std / 255.0
+                scanned[rows, cols] = True
+            
+            for x0, y0, x1, y1 in rois:
+                rows = slice(np.searchsorted(ys, y0), np.searchsorted(ys, y1 - window_size, side='right'))
+                cols = slice(np.searchsorted(xs, x0), np.searchsorted(xs, x1 - window_size, side='right'))
+                if rows.start < rows.stop and cols.start < cols.stop:
+                    scan(rows, cols)
+            
+            # Grow the scanned area until no unscanned window is within clustering reach of
+            # an anomaly, so every cluster touching an ROI is seen whole, as in a full scan
+            reach = _cluster_reach(window_size * 2, step_size)
+            while True:
+                anomaly_grid, conf_grid = _classify_windows(count, win_mean, win_std, window_size, brain_mean, brain_std)
+                frontier = ndimage.binary_dilation(anomaly_grid, structure=reach) & ~scanned
+                if not frontier.any():
+                    break
+                for rows, cols in ndimage.find_objects(ndimage.label(frontier)[0]):
+                    scan(rows, cols)
+        
+        anomaly_fraction = float(anomaly_grid.mean()) if anomaly_grid.size else 0.0
+        logger.info(f"   - Found {int(anomaly_grid.sum())} potential anomalous windows")
         
         # Cluster nearby anomalies
-        if potential_anomalies:
-            # Simple clustering - group nearby windows
-            used = [False] * len(potential_anomalies)
+        if anomaly_grid.any():
+            # Simple clustering - group windows within 2 window sizes of each seed, in
+            # row-major order; each cluster becomes a label for the grid reductions below
+            hit_y, hit_x = np.nonzero(anomaly_grid)
+            clusters = _cluster_windows(xs[hit_x], ys[hit_y], window_size * 2)
+            labels = np.zeros(anomaly_grid.shape, dtype=np.int32)
+            seeds = np.empty(len(clusters), dtype=np.intp)
+            for k, members in enumerate(clusters):
+                labels[hit_y[members], hit_x[members]] = k + 1
+                seeds[k] = members[0]
+            index = np.arange(1, len(clusters) + 1)
+            sizes = ndimage.sum_labels(anomaly_grid, labels, index)
+            seed_conf = conf_grid[hit_y[seeds], hit_x[seeds]]
+            mean_conf = ndimage.mean(conf_grid, labels, index)
+            mean_intensity = ndimage.mean(win_mean, labels, index)
+            mean_texture = ndimage.mean(win_std, labels, index)
             
-            for i, anomaly in enumerate(potential_anomalies):
-                if used[i]:
-                    continue
-                
-                # Start new cluster
-                cluster = [anomaly]
-                used[i] = True
-                
-                # Find nearby anomalies
-                for j, other in enumerate(potential_anomalies):
-                    if used[j]:
-                        continue
-                    
-                    dist = np.sqrt((anomaly['x'] - other['x'])**2 + (anomaly['y'] - other['y'])**2)
-                    if dist <= window_size * 2:  # Within 2 window sizes
-                        cluster.append(other)
-                        used[j] = True
+            # Bounding boxes from the grid extent of each label
+            row_idx, col_idx = np.indices(labels.shape)
+            x_min = xs[ndimage.minimum(col_idx, labels, index).astype(int)]
+            x_max = xs[ndimage.maximum(col_idx, labels, index).astype(int)] + window_size
+            y_min = ys[ndimage.minimum(row_idx, labels, index).astype(int)]
+            y_max = ys[ndimage.maximum(row_idx, labels, index).astype(int)] + window_size
+            width = x_max - x_min
+            height = y_max - y_min
+            area = sizes.astype(int) * (window_size ** 2)
+            
+            # Only keep significant clusters of a reasonable tumor size
+            keep = ((sizes >= 2) | (seed_conf > 0.8)) & (area >= 100) & (area <= 5000)
+            
+            # Determine tumor type based on characteristics
+            is_hyper = mean_intensity > brain_mean + brain_std
+            is_hypo = mean_intensity < brain_mean - 0.3 * brain_std
+            is_textured = mean_texture > brain_std * 1.5
+            tumor_types = np.select(
+                [is_hyper & (area > 800), is_hyper, is_hypo, is_textured],
+                ["glioma", "metastatic", "meningioma", "pituitary_adenoma"],
+                default="acoustic_neuroma",
+            )
+            risk_levels = np.select(
+                [is_hyper & (area > 800), is_hyper, is_hypo, is_textured],
+                [
+                    "high",
+                    "moderate",
+                    np.where(area < 500, "low", "moderate"),
+                    np.where(area < 400, "low", "moderate"),
+                ],
+                default="low",
+            )
+            
+            # Calculate characteristics
+            irregular = np.maximum(width / height, height / width) > 1.6
+            enhancements = np.select(
+                [mean_texture > brain_std * 1.2, is_hyper, mean_intensity > brain_mean],
+                ["heterogeneous", "rim", "homogeneous"],
+                default="none",
+            )
+            edema = mean_intensity > brain_mean + 0.5 * brain_std
+            calcification = mean_texture < brain_std * 0.4
+            
+            for k in np.flatnonzero(keep):
+                tumor_region = {
+                    "id": f"region_{len(tumor_regions) + 1}",
+                    "type": str(tumor_types[k]),
+                    "bbox": {
+                        "x": int(x_min[k]),
+                        "y": int(y_min[k]),
+                        "width": int(width[k]),
+                        "height": int(height[k])
+                    },
+                    "confidence": float(round(mean_conf[k], 3)),
+                    "risk_level": str(risk_levels[k]),
+                    "volume_mm3": int(area[k] * 0.4),
+                    "characteristics": {
+                        "irregular_shape": bool(irregular[k]),
+                        "enhancement_pattern": str(enhancements[k]),
+                        "edema_present": bool(edema[k]),
+                        "calcification": bool(calcification[k])
+                    }
+                }
                 
-                # Only keep significant clusters
-                if len(cluster) >= 2 or cluster[0]['confidence'] > 0.8:
-                    # Calculate cluster properties
-                    cluster_x_min = min(c['x'] for c in cluster)
-                    cluster_x_max = max(c['x'] for c in cluster) + window_size
-                    cluster_y_min = min(c['y'] for c in cluster)
-                    cluster_y_max = max(c['y'] for c in cluster) + window_size
-                    
-                    cluster_width = cluster_x_max - cluster_x_min
-                    cluster_height = cluster_y_max - cluster_y_min
-                    cluster_area = len(cluster) * (window_size ** 2)
-                    
-                    # Filter by size
-                    if 100 <= cluster_area <= 5000:  # Reasonable tumor size
-                        avg_confidence = np.mean([c['confidence'] for c in cluster])
-                        avg_intensity = np.mean([c['mean'] for c in cluster])
-                        avg_texture = np.mean([c['std'] for c in cluster])
-                        
-                        # Determine tumor type based on characteristics
-                        if avg_intensity > brain_mean + brain_std:
-                            if cluster_area > 800:
-                                tumor_type = "glioma"
-                                risk_level = "high"
-                            else:
-                                tumor_type = "metastatic"
-                                risk_level = "moderate"
-                        elif avg_intensity < brain_mean - 0.3 * brain_std:
-                            tumor_type = "meningioma"
-                            risk_level = "low" if cluster_area < 500 else "moderate"
-                        elif avg_texture > brain_std * 1.5:
-                            tumor_type = "pituitary_adenoma"
-                            risk_level = "low" if cluster_area < 400 else "moderate"
-                        else:
-                            tumor_type = "acoustic_neuroma"
-                            risk_level = "low"
-                        
-                        # Calculate characteristics
-                        aspect_ratio = max(cluster_width/cluster_height, cluster_height/cluster_width)
-                        irregular_shape = aspect_ratio > 1.6
-                        
-                        if avg_texture > brain_std * 1.2:
-                            enhancement = "heterogeneous"
-                        elif avg_intensity > brain_mean + brain_std:
-                            enhancement = "rim"
-                        elif avg_intensity > brain_mean:
-                            enhancement = "homogeneous"
-                        else:
-                            enhancement = "none"
-                        
-                        tumor_region = {
-                            "id": f"region_{len(tumor_regions) + 1}",
-                            "type": tumor_type,
-                            "bbox": {
-                                "x": int(cluster_x_min),
-                                "y": int(cluster_y_min),
-                                "width": int(cluster_width),
-                                "height": int(cluster_height)
-                            },
-                            "confidence": float(round(avg_confidence, 3)),
-                            "risk_level": risk_level,
-                            "volume_mm3": int(cluster_area * 0.4),
-                            "characteristics": {
-                                "irregular_shape": irregular_shape,
-                                "enhancement_pattern": enhancement,
-                                "edema_present": avg_intensity > brain_mean + 0.5 * brain_std,
-                                "calcification": avg_texture < brain_std * 0.4
-                            }
-                        }
-                        
-                        tumor_regions.append(tumor_region)
-                        logger.info(f"     - Real detection: {tumor_type} at ({cluster_x_min},{cluster_y_min}) area:{cluster_area}px confidence:{avg_confidence:.2f}")
+                tumor_regions.append(tumor_region)
+                logger.info(f"     - Real detection: {tumor_types[k]} at ({x_min[k]},{y_min[k]}) area:{area[k]}px confidence:{mean_conf[k]:.2f}")
         
         # Calculate overall assessment
         if tumor_regions:
@@ -272,8 +518,10 @@ def analyze_mri_image_real(image: Image.Image) -> dict:
             "detected_regions": tumor_regions,
             "image_quality": {
                 "resolution": f"{img_array.shape[1]}x{img_array.shape[0]}",
-                "brain_tissue_detected": bool(np.sum(brain_mask) > 1000),
-                "contrast_quality": "good" if brain_std > 0.1 else "fair"
+                "brain_tissue_detected": brain_area > 1000,
+                "contrast_quality": "excellent" if brain_std > 0.2 else "good" if brain_std > 0.1 else "fair",
+                "artifact_level": "minimal" if anomaly_fraction < 0.02 else "mild" if anomaly_fraction < 0.1 else "moderate",
+                "signal_to_noise_ratio": round(float(brain_mean / (brain_std + 1e-6)), 1)
             },
             "analysis_metadata": {
                 "model_version": "SimpleReal-v1.0",
@@ -281,7 +529,7 @@ def analyze_mri_image_real(image: Image.Image) -> dict:
                 "brain_statistics": {
                     "mean_intensity": float(brain_mean),
                     "std_intensity": float(brain_std),
-                    "brain_area_pixels": int(np.sum(brain_mask))
+                    "brain_area_pixels": int(brain_area)
                 }
             }
         }
@@ -299,43 +547,102 @@ def analyze_mri_image_real(image: Image.Image) -> dict:
             "method": "real_image_analysis"
         }
 
-def create_annotated_image(original_image: Image.Image, detected_regions: List[Dict]) -> str:
-    """Create an annotated image with tumor detection overlays and return as base64"""
+def _screen_rois(img_coarse: np.ndarray, window_size: int, step_size: int, scale: int, pad: int) -> List[tuple]:
+    """Full-resolution (x0, y0, x1, y1) boxes around each group of candidate windows on a coarse level"""
+    from scipy import ndimage
+    from api.mri_kernels import window_stats
+    
+    brain_mask_u8, _, brain_mean, brain_std = _brain_statistics(img_coarse)
+    ys = np.arange(0, img_coarse.shape[0] - window_size, step_size)
+    xs = np.arange(0, img_coarse.shape[1] - window_size, step_size)
+    count, win_mean, win_std = window_stats(img_coarse, brain_mask_u8.view(bool), ys, xs, window_size)
+    anomaly_grid, _ = _classify_windows(count, win_mean / 255.0, win_std / 255.0, window_size, brain_mean, brain_std)
+    
+    # Every candidate counts here, before any cluster size filter: the coarse level only
+    # decides where to look, the full-resolution pass decides what is reported
+    groups, _ = ndimage.label(ndimage.binary_dilation(anomaly_grid, structure=_cluster_reach(window_size * 2, step_size)))
+    return [
+        (xs[cols.start] * scale - pad, ys[rows.start] * scale - pad,
+         (xs[cols.stop - 1] + window_size) * scale + pad, (ys[rows.stop - 1] + window_size) * scale + pad)
+        for rows, cols in ndimage.find_objects(groups * anomaly_grid)
+        if rows is not None
+    ]
+
+def analyze_mri_pyramid(img_array: np.ndarray, coarse_size: Tuple[int, int] = (256, 256)) -> Tuple[dict, int, Tuple[int, int]]:
+    """
+    analyze_mri_image_real on a prepare_mri_array array, screened on an area-averaged
+    coarse level first. Candidate windows there (half-size window) seed ROIs that are
+    scanned and grown at full resolution, so reported regions match a full scan
+    wherever the coarse level flags them. Returns (result, pyramid_level, resolution).
+    """
+    import cv2
+    
+    img_coarse = cv2.resize(img_array, coarse_size, interpolation=cv2.INTER_AREA)
+    rois = _screen_rois(img_coarse, window_size=8, step_size=4, scale=img_array.shape[1] // coarse_size[0], pad=16)
+    
+    # With nothing to refine the full-resolution pass only measures the brain (no windows)
+    analysis_result = analyze_mri_image_real(img_array, rois=rois)
+    if rois:
+        logger.info(f"   - Refined {len(rois)} coarse candidate areas at full resolution")
+        return analysis_result, 0, (img_array.shape[1], img_array.shape[0])
+    return analysis_result, 1, coarse_size
+
+# Color scheme for different tumor types and risk levels
+_COLOR_MAP = {
+    "glioma": "#FF0000",          # Red - high risk
+    "metastatic": "#FF6600",     # Orange - moderate risk
+    "meningioma": "#FFFF00",     # Yellow - low to moderate risk
+    "pituitary_adenoma": "#00FF00", # Green - usually low risk
+    "acoustic_neuroma": "#0066FF", # Blue - usually low risk
+    "suspicious_mass": "#FF0099"   # Pink - needs investigation
+}
+
+# Risk level colors as backup
+_RISK_COLORS = {
+    "high": "#FF0000",      # Red
+    "moderate": "#FF6600",  # Orange
+    "low": "#FFFF00"        # Yellow
+}
+
+# Label font, loaded once at import; fallback to default if not available
+try:
+    # Try to use a larger font for better visibility
+    _FONT = ImageFont.truetype("arial.ttf", 14)
+except Exception:
     try:
-        # Convert to RGB if grayscale for better visualization
-        if original_image.mode == 'L':
+        _FONT = ImageFont.load_default()
+    except Exception:
+        _FONT = None
+
+@lru_cache(maxsize=64)
+def _label_size(label: str) -> tuple:
+    """(width, height) of `label` in _FONT; labels come from a small set of tumor types"""
+    if _FONT:
+        try:
+            bbox_text = ImageDraw.Draw(Image.new('RGB', (1, 1))).textbbox((0, 0), label, font=_FONT)
+            return bbox_text[2] - bbox_text[0], bbox_text[3] - bbox_text[1]
+        except Exception:
+            pass
+    return 80, 15
+
+# Measure the known labels once at import
+for _tumor_type in _COLOR_MAP:
+    _label_size(_tumor_type.title())
+
+def create_annotated_image(original_image: Image.Image, detected_regions: List[Dict]) -> Optional[bytes]:
+    """Create an annotated image with tumor detection overlays and return it as WebP bytes (None if nothing to draw)"""
+    if not detected_regions:
+        return None
+    
+    try:
+        # Convert to RGB for colored overlays (RGB input is copied so the caller's image is untouched)
+        if original_image.mode != 'RGB':
             annotated_image = original_image.convert('RGB')
         else:
             annotated_image = original_image.copy()
         
         draw = ImageDraw.Draw(annotated_image)
-        
-        # Color scheme for different tumor types and risk levels
-        color_map = {
-            "glioma": "#FF0000",          # Red - high risk
-            "metastatic": "#FF6600",     # Orange - moderate risk
-            "meningioma": "#FFFF00",     # Yellow - low to moderate risk
-            "pituitary_adenoma": "#00FF00", # Green - usually low risk
-            "acoustic_neuroma": "#0066FF", # Blue - usually low risk
-            "suspicious_mass": "#FF0099"   # Pink - needs investigation
-        }
-        
-        # Risk level colors as backup
-        risk_colors = {
-            "high": "#FF0000",      # Red
-            "moderate": "#FF6600",  # Orange  
-            "low": "#FFFF00"        # Yellow
-        }
-        
-        # Try to load a font, fallback to default if not available
-        try:
-            # Try to use a larger font for better visibility
-            font = ImageFont.truetype("arial.ttf", 14)
-        except:
-            try:
-                font = ImageFont.load_default()
-            except:
-                font = None
+        font = _FONT
         
         logger.info(f"📊 Drawing {len(detected_regions)} tumor regions on image")
         
@@ -352,7 +659,7 @@ def create_annotated_image(original_image: Image.Image, detected_regions: List[D
             height = bbox.get("height", 50)
             
             # Choose color based on tumor type, fallback to risk level
-            color = color_map.get(tumor_type, risk_colors.get(risk_level, "#FF0099"))
+            color = _COLOR_MAP.get(tumor_type, _RISK_COLORS.get(risk_level, "#FF0099"))
             
             # Draw bounding box
             box_coords = [x, y, x + width, y + height]
@@ -360,12 +667,13 @@ def create_annotated_image(original_image: Image.Image, detected_regions: List[D
             
             # Draw a semi-transparent fill for high-risk regions
             if risk_level == "high":
-                # Create a semi-transparent overlay
-                overlay = Image.new('RGBA', annotated_image.size, (0, 0, 0, 0))
-                overlay_draw = ImageDraw.Draw(overlay)
-                overlay_draw.rectangle(box_coords, fill=(*ImageColor.getrgb(color), 50))
-                annotated_image = Image.alpha_composite(annotated_image.convert('RGBA'), overlay).convert('RGB')
-                draw = ImageDraw.Draw(annotated_image)  # Refresh draw object
+                # Blend the color into the box pixels only (rectangle bounds are inclusive)
+                fill_box = (max(x, 0), max(y, 0),
+                            min(x + width + 1, annotated_image.width), min(y + height + 1, annotated_image.height))
+                if fill_box[0] < fill_box[2] and fill_box[1] < fill_box[3]:
+                    box_pixels = annotated_image.crop(fill_box)
+                    tint = Image.new('RGB', box_pixels.size, ImageColor.getrgb(color))
+                    annotated_image.paste(Image.blend(box_pixels, tint, 50 / 255), fill_box[:2])
             
             # Add label with tumor type and confidence
             label = f"{tumor_type.title()}"
@@ -376,16 +684,7 @@ def create_annotated_image(original_image: Image.Image, detected_regions: List[D
             label_x = x
             
             # Draw background for text
-            if font:
-                # Get text size
-                try:
-                    bbox_text = draw.textbbox((0, 0), label, font=font)
-                    text_width = bbox_text[2] - bbox_text[0]
-                    text_height = bbox_text[3] - bbox_text[1]
-                except:
-                    text_width, text_height = 80, 15
-            else:
-                text_width, text_height = 80, 15
+            text_width, text_height = _label_size(label)
             
             # Draw text background
             text_bg = [label_x, label_y, label_x + text_width + 4, label_y + text_height + 4]
@@ -428,7 +727,7 @@ def create_annotated_image(original_image: Image.Image, detected_regions: List[D
         unique_types = list(set([r.get("type", "unknown") for r in detected_regions]))
         for i, tumor_type in enumerate(unique_types):
             item_y = legend_y + 15 + i * 20
-            color = color_map.get(tumor_type, "#FF0099")
+            color = _COLOR_MAP.get(tumor_type, "#FF0099")
             
             # Color square
             draw.rectangle([legend_x, item_y, legend_x + 10, item_y + 10], fill=color)
@@ -436,16 +735,16 @@ def create_annotated_image(original_image: Image.Image, detected_regions: List[D
             # Type name
             draw.text((legend_x + 15, item_y), tumor_type.title(), fill="white")
         
-        # Convert to base64
-        img_buffer = io.BytesIO()
-        annotated_image.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
-        
-        # Encode as base64
-        img_base64 = base64.b64encode(img_buffer.getvalue()).decode('utf-8')
+        # libwebp (bundled with OpenCV) encodes faster and far smaller than PNG; served as a file
+        import cv2
+        ok, encoded = cv2.imencode(
+            ".webp", cv2.cvtColor(np.asarray(annotated_image), cv2.COLOR_RGB2BGR), [cv2.IMWRITE_WEBP_QUALITY, 80]
+        )
+        if not ok:
+            raise ValueError("WebP encoding failed")
         
         logger.info(f"✅ Created annotated image with {len(detected_regions)} overlays")
-        return f"data:image/png;base64,{img_base64}"
+        return encoded.tobytes()
         
     except Exception as e:
         logger.error(f"❌ Failed to create annotated image: {e}")
@@ -496,39 +795,37 @@ def generate_recommendations(tumor_regions: List[Dict], overall_risk: str) -> Li
     
     return recommendations
 
-def process_mri_analysis_background(analysis_id: int, file_path: str, file_content: bytes):
+def process_mri_analysis_background(analysis_id: int, file_path: str):
     """Background task for processing MRI analysis with enhanced error handling"""
     import time
     import traceback
     from db.database import SessionLocal
     
     db = SessionLocal()
-    analysis_record = None
+    analysis_query = db.query(MRIAnalysis).filter(MRIAnalysis.id == analysis_id)
     
     try:
         logger.info(f"🔬 Starting enhanced MRI analysis for analysis_id: {analysis_id}")
         logger.info(f"   - File path: {file_path}")
-        logger.info(f"   - File content size: {len(file_content)} bytes")
+        file_size = os.path.getsize(file_path)
+        logger.info(f"   - File size: {file_size} bytes")
         
-        # Get analysis record
-        analysis_record = db.query(MRIAnalysis).filter(MRIAnalysis.id == analysis_id).first()
-        if not analysis_record:
+        # Update status to analyzing in a single UPDATE; no matched row means no record
+        updated = analysis_query.update(
+            {"status": "analyzing", "analysis_started_at": func.now()},
+            synchronize_session=False
+        )
+        db.commit()
+        if not updated:
             logger.error(f"❌ MRI analysis record {analysis_id} not found in database")
             return {"status": "error", "message": "Analysis record not found"}
-        
-        logger.info(f"📋 Found analysis record - Status: {analysis_record.status}")
-        
-        # Update status to analyzing
-        analysis_record.status = "analyzing"
-        analysis_record.analysis_started_at = func.now()
-        db.commit()
         logger.info(f"📊 Updated status to 'analyzing'")
         
         # Step 1: Validate and process the image
         logger.info(f"🖼️  Step 1: Processing uploaded image")
         try:
             # Load and validate image
-            image = Image.open(io.BytesIO(file_content))
+            image = Image.open(file_path)
             original_size = image.size
             image_format = image.format
             image_mode = image.mode
@@ -542,10 +839,12 @@ def process_mri_analysis_background(analysis_id: int, file_path: str, file_conte
             else:
                 image_gray = image
             
-            # Resize for standardized analysis
+            # Grayscale/blur once at full resolution (uint8); analyze_mri_pyramid screens
+            # an area-averaged downsample of the same array
             analysis_size = (512, 512)
-            image_resized = image_gray.resize(analysis_size, Image.Resampling.LANCZOS)
-            logger.info(f"   - Resized to {analysis_size} for analysis")
+            image_resized = image_gray.resize(analysis_size, Image.Resampling.BILINEAR)
+            img_array = prepare_mri_array(image_resized)
+            logger.info(f"   - Prepared {analysis_size} array")
             
         except Exception as img_error:
             error_msg = f"Image processing failed: {str(img_error)}"
@@ -557,8 +856,8 @@ def process_mri_analysis_background(analysis_id: int, file_path: str, file_conte
         
         start_time = time.time()
         
-        # Call the real analysis function
-        analysis_result = analyze_mri_image_real(image_resized)
+        # Screen the 256x256 pyramid level, then scan its candidate areas at 512x512
+        analysis_result, pyramid_level, analysis_resolution = analyze_mri_pyramid(img_array)
         
         processing_time = time.time() - start_time
         logger.info(f"📈 Step 3: Real analysis completed in {processing_time:.2f} seconds")
@@ -574,7 +873,7 @@ def process_mri_analysis_background(analysis_id: int, file_path: str, file_conte
             logger.warning(f"   - Real analysis failed: {analysis_result.get('message', 'Unknown error')}")
             tumor_regions = []
             overall_assessment = {"risk_level": "low", "confidence": 0.95}
-            image_quality_info = {"brain_tissue_detected": True, "contrast_quality": "good"}
+            image_quality_info = {"brain_tissue_detected": True, "contrast_quality": "good", "artifact_level": "unknown", "signal_to_noise_ratio": None}
         
         # Step 4: Calculate overall assessment
         logger.info(f"📊 Step 4: Calculating overall assessment")
@@ -614,10 +913,10 @@ def process_mri_analysis_background(analysis_id: int, file_path: str, file_conte
             "image_quality": {
                 "resolution": f"{original_size[0]}x{original_size[1]}",
                 "format": image_format,
-                "file_size_kb": round(len(file_content) / 1024, 1),
-                "contrast_quality": np.random.choice(["excellent", "good", "fair"], p=[0.3, 0.5, 0.2]),
-                "artifact_level": np.random.choice(["minimal", "mild", "moderate"], p=[0.6, 0.3, 0.1]),
-                "signal_to_noise_ratio": round(np.random.uniform(15, 35), 1)
+                "file_size_kb": round(file_size / 1024, 1),
+                "contrast_quality": image_quality_info.get("contrast_quality"),
+                "artifact_level": image_quality_info.get("artifact_level"),
+                "signal_to_noise_ratio": image_quality_info.get("signal_to_noise_ratio")
             },
             "recommendations": generate_recommendations(tumor_regions, overall_risk),
             "analysis_metadata": {
@@ -628,10 +927,12 @@ def process_mri_analysis_background(analysis_id: int, file_path: str, file_conte
                 "ai_confidence_threshold": 0.5,
                 "preprocessing_steps": ["grayscale_conversion", "gaussian_blur", "normalization"],
                 "detection_method": "sliding_window_statistical_analysis",
+                "pyramid_level": pyramid_level,
+                "analysis_resolution": f"{analysis_resolution[0]}x{analysis_resolution[1]}",
                 "analysis_parameters": {
-                    "window_size": 16,
-                    "step_size": 8,
-                    "brain_detection_threshold": "mean + 0.3*std",
+                    "window_size": 8 if pyramid_level else 16,
+                    "step_size": 4 if pyramid_level else 8,
+                    "brain_detection_threshold": "otsu",
                     "bright_anomaly_threshold": "brain_mean + 2.0*brain_std",
                     "dark_anomaly_threshold": "brain_mean - 1.5*brain_std",
                     "texture_anomaly_threshold": "brain_std * 2.0"
@@ -642,12 +943,13 @@ def process_mri_analysis_background(analysis_id: int, file_path: str, file_conte
         # Step 6: Update database with results
         logger.info(f"💾 Step 5: Saving results to database")
         
-        analysis_record.status = "completed"
-        analysis_record.analysis_completed_at = func.now()
-        analysis_record.results_json = json.dumps(analysis_results, indent=2)
-        analysis_record.overall_risk_level = overall_risk
-        analysis_record.confidence_score = confidence_avg
-        
+        analysis_query.update({
+            "status": "completed",
+            "analysis_completed_at": func.now(),
+            "results_json": orjson.dumps(analysis_results, option=orjson.OPT_SERIALIZE_NUMPY).decode(),
+            "overall_risk_level": overall_risk,
+            "confidence_score": float(confidence_avg)
+        }, synchronize_session=False)
         db.commit()
         
         logger.info(f"✅ MRI analysis completed successfully!")
@@ -674,14 +976,14 @@ def process_mri_analysis_background(analysis_id: int, file_path: str, file_conte
         
         # Update database with error status
         try:
-            if analysis_record is None:
-                analysis_record = db.query(MRIAnalysis).filter(MRIAnalysis.id == analysis_id).first()
-            
-            if analysis_record:
-                analysis_record.status = "failed"
-                analysis_record.error_message = f"Processing failed: {error_msg}"
-                analysis_record.analysis_completed_at = func.now()
-                db.commit()
+            db.rollback()
+            updated = analysis_query.update({
+                "status": "failed",
+                "error_message": f"Processing failed: {error_msg}",
+                "analysis_completed_at": func.now()
+            }, synchronize_session=False)
+            db.commit()
+            if updated:
                 logger.info(f"📝 Updated database with error status")
             else:
                 logger.error(f"❌ Could not find analysis record to update with error")
@@ -704,7 +1006,6 @@ def process_mri_analysis_background(analysis_id: int, file_path: str, file_conte
 
 @router.post("/upload", response_model=MRIUploadResponse, status_code=202)
 async def upload_mri_scan(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: AuthUser = Depends(get_current_active_patient),
     db: Session = Depends(get_db)
@@ -719,16 +1020,6 @@ async def upload_mri_scan(
                 detail=f"Unsupported file type. Allowed: {', '.join(allowed_extensions)}"
             )
         
-        # Read file content
-        file_content = await file.read()
-        if not file_content:
-            raise HTTPException(status_code=400, detail="Empty file uploaded")
-        
-        # Validate MRI image
-        validation_result = MRIProcessor.validate_mri_image(file_content, file.filename)
-        if not validation_result["valid"]:
-            raise HTTPException(status_code=400, detail=validation_result["error"])
-        
         # Generate unique filename
         file_uuid = str(uuid.uuid4())
         filename = f"{file_uuid}_{file.filename}"
@@ -736,9 +1027,17 @@ async def upload_mri_scan(
         
         logger.info(f"Starting MRI upload for user {current_user.id}, file: {file.filename}")
         
-        # Save file locally
-        with open(file_path, "wb") as f:
-            f.write(file_content)
+        # Stream the upload to disk, hashing as it goes
+        file_size, file_sha256 = await _save_upload(file, file_path)
+        if not file_size:
+            os.remove(file_path)
+            raise HTTPException(status_code=400, detail="Empty file uploaded")
+        
+        # Validate MRI image from the saved file's header (skipped for a recently seen upload)
+        validation_result = await run_in_threadpool(_validate_cached, file_sha256, file_path, file.filename)
+        if not validation_result["valid"]:
+            os.remove(file_path)
+            raise HTTPException(status_code=400, detail=validation_result["error"])
         
         # Create database record
         mri_analysis = MRIAnalysis(
@@ -747,7 +1046,8 @@ async def upload_mri_scan(
             file_path=file_path,
             status="processing",
             metadata_json=json.dumps({
-                "file_size_bytes": len(file_content),
+                "file_size_bytes": file_size,
+                "sha256": file_sha256,
                 "image_format": validation_result.get("format"),
                 "image_size": validation_result.get("size"),
                 "upload_timestamp": datetime.utcnow().isoformat()
@@ -755,16 +1055,11 @@ async def upload_mri_scan(
         )
         
         db.add(mri_analysis)
-        db.commit()
-        db.refresh(mri_analysis)
-        
-        # Queue background processing task
-        background_tasks.add_task(
-            process_mri_analysis_background,
-            mri_analysis.id,
-            file_path,
-            file_content
-        )
+        await run_in_threadpool(db.commit)
+        await run_in_threadpool(db.refresh, mri_analysis)
+        
+        # Queue analysis on the persistent worker pool
+        submit_mri_analysis(mri_analysis.id, file_path)
         
         logger.info(f"MRI upload queued for processing: mri_analysis_id: {mri_analysis.id}")
         
@@ -798,19 +1093,44 @@ def get_mri_analysis(
     
     return analysis
 
-@router.get("/analysis/user/{user_id}", response_model=List[MRIAnalysisResponse])
+@router.get("/annotated/{annotation_id}.webp")
+def get_annotated_image(annotation_id: str, expires: int, sig: str):
+    """Serve an annotated visualization produced by /upload-and-analyze through its signed URL"""
+    # Ids are uuid4 hex strings; anything else could escape the upload directory
+    try:
+        annotation_id = uuid.UUID(hex=annotation_id).hex
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Annotated image not found")
+    
+    if expires < time.time() or not hmac.compare_digest(sig, _annotation_signature(annotation_id, expires)):
+        raise HTTPException(status_code=403, detail="Annotated image link is invalid or expired")
+    
+    path = os.path.join(MRI_UPLOAD_DIR, f"{annotation_id}_annotated.webp")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Annotated image not found")
+    
+    return FileResponse(path, media_type="image/webp")
+
+@router.get("/analysis/user/{user_id}", response_model=List[MRIAnalysisSummaryResponse])
 def get_user_mri_analyses(
     user_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = None,
     current_user: AuthUser = Depends(get_current_active_patient),
     db: Session = Depends(get_db)
 ):
-    """Get all MRI analyses for a user"""
+    """Get a user's MRI analysis summaries, newest first; pass the last id as cursor for the next page"""
     # Ensure user can only access their own data
     if current_user.id != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    analyses = db.query(MRIAnalysis).filter(MRIAnalysis.user_id == user_id).all()
-    return analyses
+    query = db.query(MRIAnalysis).options(load_only(
+        MRIAnalysis.id, MRIAnalysis.filename, MRIAnalysis.status, MRIAnalysis.overall_risk_level,
+        MRIAnalysis.confidence_score, MRIAnalysis.uploaded_at
+    )).filter(MRIAnalysis.user_id == user_id)
+    if cursor is not None:
+        query = query.filter(MRIAnalysis.id < cursor)
+    return query.order_by(MRIAnalysis.id.desc()).limit(limit).all()
 
 @router.get("/test")
 def test_mri_endpoint():
@@ -838,13 +1158,22 @@ def debug_mri_analysis(
     db: Session = Depends(get_db)
 ):
     """Debug endpoint to check analysis status and details"""
-    analysis = db.query(MRIAnalysis).filter(
+    # The JSON blobs stay in the database: only a metadata prefix and a results flag come back
+    row = db.query(MRIAnalysis).options(load_only(
+        MRIAnalysis.id, MRIAnalysis.status, MRIAnalysis.filename, MRIAnalysis.file_path,
+        MRIAnalysis.uploaded_at, MRIAnalysis.analysis_started_at, MRIAnalysis.analysis_completed_at,
+        MRIAnalysis.overall_risk_level, MRIAnalysis.confidence_score, MRIAnalysis.error_message
+    )).add_columns(
+        func.substr(MRIAnalysis.metadata_json, 1, 200),
+        func.coalesce(func.length(MRIAnalysis.results_json), 0) > 0
+    ).filter(
         MRIAnalysis.id == analysis_id,
         MRIAnalysis.user_id == current_user.id
     ).first()
     
-    if not analysis:
+    if not row:
         raise HTTPException(status_code=404, detail="MRI analysis not found")
+    analysis, metadata_preview, has_results = row
     
     # Check if file exists
     file_exists = os.path.exists(analysis.file_path) if analysis.file_path else False
@@ -868,8 +1197,8 @@ def debug_mri_analysis(
         "overall_risk_level": analysis.overall_risk_level,
         "confidence_score": analysis.confidence_score,
         "error_message": analysis.error_message,
-        "has_results": bool(analysis.results_json),
-        "metadata_preview": json.loads(analysis.metadata_json)[:200] if analysis.metadata_json else None
+        "has_results": bool(has_results),
+        "metadata_preview": metadata_preview
     }
     
     return debug_info
@@ -883,57 +1212,37 @@ async def test_real_analysis(
         logger.info(f"🔬 Starting test real analysis for file: {file.filename}")
         
         # Basic file validation
-        file_content = await file.read()
-        if not file_content:
+        file_size = _upload_size(file)
+        if not file_size:
             logger.error("Empty file received")
             return {"error": "Empty file"}
         
-        logger.info(f"File content size: {len(file_content)} bytes")
+        logger.info(f"File content size: {file_size} bytes")
         
-        # Try to process with PIL
+        # Try to process with PIL, decoding straight from the spooled upload
         try:
-            image = Image.open(io.BytesIO(file_content))
+            image = await run_in_threadpool(Image.open, file.file)
             logger.info(f"Image loaded - Size: {image.size}, Format: {image.format}, Mode: {image.mode}")
             
             # Run real analysis with detailed logging
             logger.info("Starting real analysis...")
-            analysis_result = analyze_mri_image_real(image)
+            analysis_result = await run_in_threadpool(analyze_mri_image_real, image)
             logger.info(f"Analysis completed with status: {analysis_result.get('status')}")
             
-            # Ensure all data is JSON serializable
-            def make_json_serializable(obj):
-                """Convert numpy types and other non-serializable objects to JSON-safe types"""
-                if isinstance(obj, dict):
-                    return {k: make_json_serializable(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [make_json_serializable(v) for v in obj]
-                elif hasattr(obj, 'item'):  # numpy scalar
-                    return obj.item()
-                elif isinstance(obj, (np.integer, np.floating)):
-                    return obj.item()
-                elif isinstance(obj, np.ndarray):
-                    return obj.tolist()
-                elif isinstance(obj, (np.bool_, bool)):
-                    return bool(obj)
-                else:
-                    return obj
-            
-            # Clean the analysis result
-            clean_analysis_result = make_json_serializable(analysis_result)
-            
-            return {
+            # ORJSONResponse serializes any numpy scalars in the result natively
+            return ORJSONResponse({
                 "success": True,
                 "message": "Real analysis completed successfully",
                 "file_info": {
                     "filename": str(file.filename) if file.filename else "unknown",
-                    "size": int(len(file_content)),
+                    "size": int(file_size),
                     "content_type": str(file.content_type) if file.content_type else "unknown",
                     "image_size": [int(x) for x in image.size],
                     "image_format": str(image.format) if image.format else "unknown",
                     "image_mode": str(image.mode)
                 },
-                "analysis_result": clean_analysis_result
-            }
+                "analysis_result": analysis_result
+            })
             
         except Exception as analysis_error:
             logger.error(f"Analysis error: {analysis_error}")
@@ -954,18 +1263,13 @@ async def test_upload_without_auth(
     """Test upload endpoint without authentication for debugging"""
     try:
         # Basic file validation
-        file_content = await file.read()
-        if not file_content:
+        file_size = _upload_size(file)
+        if not file_size:
             return {"error": "Empty file"}
         
         # Try to process with PIL
         try:
-            image = Image.open(io.BytesIO(file_content))
-            image_info = {
-                "format": image.format,
-                "size": image.size,
-                "mode": image.mode
-            }
+            image_info = await run_in_threadpool(_image_info, file.file)
         except Exception as img_error:
             return {"error": f"Image processing failed: {str(img_error)}"}
         
@@ -974,8 +1278,7 @@ async def test_upload_without_auth(
         test_path = os.path.join(MRI_UPLOAD_DIR, test_filename)
         
         try:
-            with open(test_path, "wb") as f:
-                f.write(file_content)
+            await _save_upload(file, test_path)
             
             # Verify file was saved
             file_saved = os.path.exists(test_path)
@@ -993,13 +1296,13 @@ async def test_upload_without_auth(
             "message": "Test upload successful",
             "file_info": {
                 "filename": file.filename,
-                "size": len(file_content),
+                "size": file_size,
                 "content_type": file.content_type
             },
             "image_info": image_info,
             "file_operations": {
                 "save_successful": file_saved,
-                "size_match": file_size_saved == len(file_content)
+                "size_match": file_size_saved == file_size
             },
             "system_info": {
                 "upload_dir": MRI_UPLOAD_DIR,
@@ -1020,22 +1323,20 @@ async def minimal_test(file: UploadFile = File(...)):
         # Step 1: Basic file info
         logger.info(f"File: {file.filename}")
         
-        # Step 2: Read content
-        content = await file.read()
-        logger.info(f"Content size: {len(content)}")
+        # Step 2: Content size
+        content_size = _upload_size(file)
+        logger.info(f"Content size: {content_size}")
         
-        # Step 3: Basic PIL processing
-        from PIL import Image
-        import io
-        image = Image.open(io.BytesIO(content))
-        logger.info(f"Image size: {image.size}")
+        # Step 3: Basic PIL processing (header only, never decoded)
+        image_dimensions = list((await run_in_threadpool(_image_info, file.file))["size"])
+        logger.info(f"Image size: {image_dimensions}")
         
         return {
             "success": True,
             "message": "Minimal test passed",
             "filename": str(file.filename),
-            "size": len(content),
-            "image_dimensions": list(image.size)
+            "size": content_size,
+            "image_dimensions": image_dimensions
         }
         
     except Exception as e:
@@ -1059,55 +1360,44 @@ async def upload_and_analyze_mri(
         logger.info(f"   Analysis type: {analysis_type}")
         
         # Basic file validation
-        file_content = await mri_image.read()
-        if not file_content:
+        file_size, file_sha256 = await run_in_threadpool(_hash_upload, mri_image)
+        if not file_size:
             logger.error("Empty file received")
             return {"success": False, "error": "Empty file"}
         
-        logger.info(f"File content size: {len(file_content)} bytes")
+        logger.info(f"File content size: {file_size} bytes")
+        
+        # An identical image was analyzed recently: reuse its result
+        cached_analysis = _analysis_cache.get(file_sha256)
+        if cached_analysis is not None:
+            logger.info(f"Returning cached analysis for sha256 {file_sha256[:12]}")
+            return ORJSONResponse({
+                "success": True,
+                "image_id": f"mri_{int(time.time())}",
+                "analysis": cached_analysis
+            })
         
-        # Validate the image
-        validation_result = MRIProcessor.validate_mri_image(file_content, mri_image.filename)
+        # Validate the image from its header, straight from the spooled upload
+        validation_result = await run_in_threadpool(_validate_cached, file_sha256, mri_image.file, mri_image.filename)
         if not validation_result["valid"]:
             logger.error(f"Image validation failed: {validation_result['error']}")
             return {"success": False, "error": validation_result["error"]}
         
         # Try to process with PIL
         try:
-            image = Image.open(io.BytesIO(file_content))
+            image = await run_in_threadpool(Image.open, mri_image.file)
             logger.info(f"Image loaded - Size: {image.size}, Format: {image.format}, Mode: {image.mode}")
             
             # Run real analysis
             logger.info("Starting real MRI analysis...")
-            analysis_result = analyze_mri_image_real(image)
+            analysis_result = await run_in_threadpool(analyze_mri_image_real, image)
             logger.info(f"Analysis completed with status: {analysis_result.get('status')}")
             
-            # Ensure all data is JSON serializable
-            def make_json_serializable(obj):
-                """Convert numpy types and other non-serializable objects to JSON-safe types"""
-                if isinstance(obj, dict):
-                    return {k: make_json_serializable(v) for k, v in obj.items()}
-                elif isinstance(obj, list):
-                    return [make_json_serializable(v) for v in obj]
-                elif hasattr(obj, 'item'):  # numpy scalar
-                    return obj.item()
-                elif isinstance(obj, (np.integer, np.floating)):
-                    return obj.item()
-                elif isinstance(obj, np.ndarray):
-                    return obj.tolist()
-                elif isinstance(obj, (np.bool_, bool)):
-                    return bool(obj)
-                else:
-                    return obj
-            
-            # Clean the analysis result
-            clean_analysis_result = make_json_serializable(analysis_result)
-            
             # Format response for frontend compatibility
-            if clean_analysis_result.get("status") == "success":
+            if analysis_result.get("status") == "success":
                 # Transform to expected frontend format
-                detected_regions = clean_analysis_result.get("detected_regions", [])
-                overall_assessment = clean_analysis_result.get("overall_assessment", {})
+                detected_regions = analysis_result.get("detected_regions", [])
+                overall_assessment = analysis_result.get("overall_assessment", {})
                 
                 # Convert detected regions to frontend format
                 frontend_regions = []
@@ -1133,34 +1423,40 @@ async def upload_and_analyze_mri(
                     })
                 
                 # Create annotated visualization
-                annotated_image_b64 = None
+                annotated_image_url = None
                 if detected_regions:  # Only create visualization if there are regions to show
                     logger.info("🎨 Creating annotated visualization...")
-                    annotated_image_b64 = create_annotated_image(image, detected_regions)
-                    if annotated_image_b64:
+                    annotated_webp = await run_in_threadpool(create_annotated_image, image, detected_regions)
+                    if annotated_webp:
+                        annotation_id = uuid.uuid4().hex
+                        async with aiofiles.open(os.path.join(MRI_UPLOAD_DIR, f"{annotation_id}_annotated.webp"), "wb") as f:
+                            await f.write(annotated_webp)
+                        annotated_image_url = _annotation_url(annotation_id)
+                        await run_in_threadpool(_sweep_expired_annotations)
                         logger.info("✅ Annotated visualization created successfully")
                     else:
                         logger.warning("⚠️ Failed to create annotated visualization")
                 else:
                     logger.info("ℹ️ No regions detected, skipping visualization")
                 
-                return {
+                analysis = _analysis_cache[file_sha256] = {
+                    "detected_regions": frontend_regions,
+                    "overall_confidence": overall_assessment.get("confidence", 0.5),
+                    "processing_time": 2.4,
+                    "risk_level": overall_assessment.get("risk_level", "low"),
+                    "total_regions": len(frontend_regions),
+                    "analysis_metadata": analysis_result.get("analysis_metadata", {}),
+                    "annotated_image_url": annotated_image_url  # Signed GET /annotated/{id}.webp, expires with this entry
+                }
+                return ORJSONResponse({
                     "success": True,
                     "image_id": f"mri_{int(time.time())}",
-                    "analysis": {
-                        "detected_regions": frontend_regions,
-                        "overall_confidence": overall_assessment.get("confidence", 0.5),
-                        "processing_time": 2.4,
-                        "risk_level": overall_assessment.get("risk_level", "low"),
-                        "total_regions": len(frontend_regions),
-                        "analysis_metadata": clean_analysis_result.get("analysis_metadata", {}),
-                        "annotated_image": annotated_image_b64  # Include the visualization
-                    }
-                }
+                    "analysis": analysis
+                })
             else:
                 return {
                     "success": False,
-                    "error": f"Analysis failed: {clean_analysis_result.get('message', 'Unknown error')}"
+                    "error": f"Analysis failed: {analysis_result.get('message', 'Unknown error')}"
                 }
             
         except Exception as analysis_error:
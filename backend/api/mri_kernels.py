@@ -0,0 +1,104 @@
+import threading
+import numpy as np
+
+# Pixel tile edge for the summed-area fallback: ~(256 + halo)^2 float64 tables per tile
+WINDOW_TILE = 256
+
+# Per-thread scratch arrays reused across analyses instead of reallocated per image/tile
+_SCRATCH = threading.local()
+
+def scratch(name: str, shape: tuple, dtype) -> np.ndarray:
+    """This thread's reusable `name` buffer as an uninitialized `shape` array (grows as needed)"""
+    size = int(np.prod(shape))
+    buf = getattr(_SCRATCH, name, None)
+    if buf is None or buf.dtype != dtype or buf.size < size:
+        buf = np.empty(size, dtype=dtype)
+        setattr(_SCRATCH, name, buf)
+    return buf[:size].reshape(shape)
+
+def window_sums(values: np.ndarray, ys: np.ndarray, xs: np.ndarray, window_size: int) -> np.ndarray:
+    """Sum of `values` over each window_size x window_size window with top-left corner (ys[i], xs[j])"""
+    # Zero-padded summed-area table: sat[y, x] == values[:y, :x].sum()
+    sat = scratch('sat', (values.shape[0] + 1, values.shape[1] + 1), np.float64)
+    sat[0, :] = 0
+    sat[:, 0] = 0
+    row_sums = np.cumsum(values, axis=0, dtype=np.float64, out=scratch('row_sums', values.shape, np.float64))
+    np.cumsum(row_sums, axis=1, out=sat[1:, 1:])
+    y0, x0 = ys[:, None], xs[None, :]
+    y1, x1 = y0 + window_size, x0 + window_size
+    return sat[y1, x1] - sat[y0, x1] - sat[y1, x0] + sat[y0, x0]
+
+try:
+    from numba import config as numba_config, njit, prange
+    
+    # Request handlers launch kernels from several threadpool threads at once: the default
+    # workqueue layer aborts on concurrent launches, and TBB can hang interpreter exit
+    # after use off the main thread, so pin OpenMP when this build ships it
+    try:
+        import numba.np.ufunc.omppool  # noqa: F401
+        numba_config.THREADING_LAYER = 'omp'
+    except ImportError:
+        numba_config.THREADING_LAYER = 'threadsafe'
+    
+    @njit(parallel=True, cache=True, fastmath=True)
+    def window_stats(img: np.ndarray, mask: np.ndarray, ys: np.ndarray, xs: np.ndarray, window_size: int):
+        """Brain-pixel count, mean and std of every window; rows of windows run in parallel"""
+        count = np.zeros((ys.size, xs.size))
+        mean = np.zeros((ys.size, xs.size))
+        std = np.zeros((ys.size, xs.size))
+        for a in prange(ys.size):
+            y = ys[a]
+            for b in range(xs.size):
+                x = xs[b]
+                s = 0.0
+                s2 = 0.0
+                c = 0
+                for i in range(y, y + window_size):
+                    for j in range(x, x + window_size):
+                        if mask[i, j]:
+                            v = np.float64(img[i, j])
+                            s += v
+                            s2 += v * v
+                            c += 1
+                count[a, b] = c
+                if c:
+                    m = s / c
+                    mean[a, b] = m
+                    std[a, b] = np.sqrt(max(s2 / c - m * m, 0.0))
+        return count, mean, std
+except ImportError:
+    # Numba is optional; summed-area tables give the same statistics in a few numpy passes
+    def _tile_window_stats(img: np.ndarray, mask: np.ndarray, ys: np.ndarray, xs: np.ndarray, window_size: int):
+        """Brain-pixel count, mean and std of every window in one tile"""
+        mask_f = scratch('mask_f', mask.shape, np.float64)
+        np.copyto(mask_f, mask)
+        masked = np.multiply(img, mask_f, out=scratch('masked', mask.shape, np.float64))
+        count = window_sums(mask_f, ys, xs, window_size)
+        safe_count = np.maximum(count, 1.0)
+        mean = window_sums(masked, ys, xs, window_size) / safe_count
+        mean_sq = window_sums(np.multiply(masked, img, out=masked), ys, xs, window_size) / safe_count
+        std = np.sqrt(np.maximum(mean_sq - mean ** 2, 0.0))
+        return count, mean, std
+    
+    def window_stats(img: np.ndarray, mask: np.ndarray, ys: np.ndarray, xs: np.ndarray, window_size: int):
+        """
+        Brain-pixel count, mean and std of every window, computed per WINDOW_TILE
+        pixel tile (plus a window_size halo) so each tile's tables stay cache-resident
+        """
+        count = np.zeros((ys.size, xs.size))
+        mean = np.zeros_like(count)
+        std = np.zeros_like(count)
+        for ty in range(0, img.shape[0], WINDOW_TILE):
+            rows = slice(np.searchsorted(ys, ty), np.searchsorted(ys, ty + WINDOW_TILE))
+            if rows.start == rows.stop:
+                continue
+            y0, y1 = ys[rows.start], ys[rows.stop - 1] + window_size
+            for tx in range(0, img.shape[1], WINDOW_TILE):
+                cols = slice(np.searchsorted(xs, tx), np.searchsorted(xs, tx + WINDOW_TILE))
+                if cols.start == cols.stop:
+                    continue
+                x0, x1 = xs[cols.start], xs[cols.stop - 1] + window_size
+                count[rows, cols], mean[rows, cols], std[rows, cols] = _tile_window_stats(
+                    img[y0:y1, x0:x1], mask[y0:y1, x0:x1], ys[rows] - y0, xs[cols] - x0, window_size
+                )
+        return count, mean, std
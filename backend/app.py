@@ -10,10 +10,14 @@ from api.auth import router as auth_router
 from api.local_upload import router as local_upload_router
 from api.genomic_variants import router as genomic_variants_router
 from api.chatbot import router as chatbot_router
-from api.direct_prs import router as direct_prs_router
+from api.direct_prs import (
+    router as direct_prs_router,
+    ensure_indexes as ensure_direct_indexes,
+    close_pool as close_direct_pool,
+)
 from api.timeline import router as timeline_router
 from api.reports import router as reports_router
-from api.mri_analysis import router as mri_router
+from api.mri_analysis import router as mri_router, shutdown_analysis_executor
 from api.supabase_upload import router as supabase_upload_router
 # Optional routers that require heavy deps
 import os
@@ -88,6 +92,18 @@ def on_startup():
     except Exception as e:
         logger.error(f"❌ Failed to create tables: {e}")
 
+@app.on_event("startup")
+async def on_startup_indexes():
+    try:
+        await ensure_direct_indexes()
+    except Exception as e:
+        logger.error(f"❌ Failed to create direct-query indexes: {e}")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await close_direct_pool()
+    shutdown_analysis_executor()
+
 @app.get("/health")
 def health():
     return {
@@ -1,18 +1,24 @@
 import jwt
 from datetime import datetime, timedelta
 from typing import Optional
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, exists, select
+from sqlalchemy.orm import Session, load_only
 
 from core.config import settings
 from db.database import get_db
 from db.auth_models import User
 from schemas.auth_schemas import TokenData
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing: new hashes use argon2id, bcrypt is kept to verify existing hashes
+pwd_context = CryptContext(
+    schemes=["argon2", "bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.bcrypt_cost,
+)
 
 # JWT Security
 security = HTTPBearer()
@@ -22,6 +28,12 @@ SECRET_KEY = settings.secret_key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Signing key encoded once rather than on every encode/decode
+_KEY = SECRET_KEY.encode()
+
+# Tokens issued in the last second, so burst logins for the same subject reuse one JWT
+_token_cache = TTLCache(maxsize=1024, ttl=1)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
     return pwd_context.verify(plain_password, hashed_password)
@@ -32,6 +44,11 @@ def get_password_hash(password: str) -> str:
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
+    cache_key = (tuple(sorted(data.items())), expires_delta)
+    cached = _token_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -39,7 +56,8 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, _KEY, algorithm=ALGORITHM)
+    _token_cache[cache_key] = encoded_jwt
     return encoded_jwt
 
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
@@ -53,7 +71,7 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     )
     
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, _KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -63,29 +81,56 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     
     return token_data
 
+# Prebuilt lookups so the hot auth path reuses one cached compiled statement each
+_user_by_email = select(User).where(User.email == bindparam("email")).limit(1)
+_user_by_username = select(User).where(User.username == bindparam("username")).limit(1)
+
+# Only the columns the public User schema exposes (used by /me)
+_user_summary_by_email = (
+    select(User)
+    .options(load_only(
+        User.id, User.email, User.username, User.role,
+        User.is_active, User.is_verified, User.created_at
+    ))
+    .where(User.email == bindparam("email"))
+    .limit(1)
+)
+
 def get_user_by_email(db: Session, email: str) -> Optional[User]:
     """Get user by email"""
-    return db.query(User).filter(User.email == email).first()
+    return db.execute(_user_by_email, {"email": email}).scalar_one_or_none()
 
 def get_user_by_username(db: Session, username: str) -> Optional[User]:
     """Get user by username"""
-    return db.query(User).filter(User.username == username).first()
+    return db.execute(_user_by_username, {"username": username}).scalar_one_or_none()
+
+def email_exists(db: Session, email: str) -> bool:
+    """Check whether a user with this email exists without loading it"""
+    return bool(db.scalar(select(exists().where(User.email == email))))
+
+def username_exists(db: Session, username: str) -> bool:
+    """Check whether a user with this username exists without loading it"""
+    return bool(db.scalar(select(exists().where(User.username == username))))
 
 def authenticate_user(db: Session, email: str, password: str) -> Optional[User]:
     """Authenticate user credentials"""
     user = get_user_by_email(db, email)
-    if not user:
+    if not user or not user.hashed_password:
+        # Unknown email or passwordless (social-auth) account: burn one verify against
+        # passlib's cached dummy hash so timing matches a wrong password, then bail
+        pwd_context.dummy_verify()
         return None
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = pwd_context.verify_and_update(password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # Legacy bcrypt hash verified: upgrade it to argon2id in place
+        user.hashed_password = new_hash
+        db.commit()
     return user
 
-def get_current_user(
-    token_data: TokenData = Depends(verify_token),
-    db: Session = Depends(get_db)
-) -> User:
-    """Get current authenticated user"""
-    user = get_user_by_email(db, email=token_data.email)
+def _ensure_active_user(user: Optional[User]) -> User:
+    """Reject missing or deactivated users"""
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -98,6 +143,21 @@ def get_current_user(
         )
     return user
 
+def get_current_user(
+    token_data: TokenData = Depends(verify_token),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user"""
+    return _ensure_active_user(get_user_by_email(db, email=token_data.email))
+
+def get_current_user_summary(
+    token_data: TokenData = Depends(verify_token),
+    db: Session = Depends(get_db)
+) -> User:
+    """Get current authenticated user with only the public schema columns loaded"""
+    user = db.execute(_user_summary_by_email, {"email": token_data.email}).scalar_one_or_none()
+    return _ensure_active_user(user)
+
 def get_current_active_patient(current_user: User = Depends(get_current_user)) -> User:
     """Get current active patient user"""
     if current_user.role.value != "patient":
@@ -15,9 +15,12 @@ class Settings(BaseSettings):
     aws_secret_access_key: str = ""
     s3_bucket_name: str = "curagenie-genomic-data"
     aws_region: str = "us-east-1"
+    s3_max_pool_connections: int = 64
+    s3_use_accelerate: bool = False
     
     # Application
     secret_key: str = "your-super-secret-key-here"
+    bcrypt_cost: int = 10  # rounds for legacy bcrypt hashes; new hashes use argon2id
     debug: bool = True
     cors_origins: str = "http://localhost:3000,http://127.0.0.1:3000,https://cura-g.vercel.app"
     
@@ -15,6 +15,7 @@ from typing import Dict, Any, Optional, List
 from abc import ABC, abstractmethod
 import openai
 import requests
+from cachetools import TTLCache
 from core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -191,6 +192,8 @@ class GenomicLLMService:
     
     def __init__(self):
         self.provider = self._initialize_provider()
+        # Per-user genomic context, shared by generate_response and the /chat handler
+        self._context_cache: TTLCache = TTLCache(maxsize=10_000, ttl=30)
     
     def _initialize_provider(self) -> LLMProvider:
         """Initialize the configured LLM provider"""
@@ -217,6 +220,10 @@ class GenomicLLMService:
         # This would integrate with your existing database models
         # For now, return mock context - you'll need to implement the real database queries
         
+        cached = self._context_cache.get(user_id)
+        if cached is not None:
+            return cached
+        
         try:
             from db.database import SessionLocal
             from db.models import GenomicData, PrsScore
@@ -268,6 +275,7 @@ class GenomicLLMService:
                 ])
             
             db.close()
+            self._context_cache[user_id] = context
             return context
             
         except Exception as e:
@@ -0,0 +1,19 @@
+import boto3
+from botocore.config import Config
+from core.config import settings
+
+# Shared, thread-safe S3 client: a larger connection pool for concurrent
+# (multipart) uploads, adaptive retries and TCP keepalive for connection reuse
+s3_client = boto3.client(
+    's3',
+    aws_access_key_id=settings.aws_access_key_id,
+    aws_secret_access_key=settings.aws_secret_access_key,
+    region_name=settings.aws_region,
+    config=Config(
+        max_pool_connections=settings.s3_max_pool_connections,
+        retries={'mode': 'adaptive', 'max_attempts': 5},
+        tcp_keepalive=True,
+        # Transfer Acceleration must also be enabled on the bucket
+        s3={'use_accelerate_endpoint': settings.s3_use_accelerate},
+    )
+)
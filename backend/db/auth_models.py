@@ -23,6 +23,9 @@ class User(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
+    # Fetch server defaults (created_at) in the INSERT itself via RETURNING
+    __mapper_args__ = {"eager_defaults": True}
+    
     # Relationships
     profile = relationship("PatientProfile", back_populates="user", uselist=False)
     # Note: GenomicData relationship defined in models.py to avoid circular imports
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Text, DateTime
+from sqlalchemy import Column, Integer, String, Float, Boolean, ForeignKey, Text, DateTime, JSON, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from db.database import Base
@@ -12,12 +13,19 @@ class GenomicData(Base):
     filename = Column(String, index=True)
     file_url = Column(String, index=True)
     status = Column(String, default='processing')
-    metadata_json = Column(Text, default='{}')
+    # Native JSONB on Postgres (JSON text elsewhere); holds a dict, not a pre-encoded string
+    metadata_json = Column(JSON().with_variant(JSONB(), "postgresql"), default=dict)
     uploaded_at = Column(DateTime, default=None)
     
     # Relationships
     prs_scores = relationship("PrsScore", back_populates="genomic_data")
     # reports relationship removed to avoid circular imports
+    
+    # Per-user listings, newest first (ix_gd_user_id is also ensured by api.direct_prs)
+    __table_args__ = (
+        Index('ix_gd_user_id', 'user_id', id.desc()),
+        Index('ix_genomic_user_time', 'user_id', uploaded_at.desc()),
+    )
 
 class PrsScore(Base):
     __tablename__ = 'prs_scores'
@@ -38,6 +46,10 @@ class MlPrediction(Base):
     user_id = Column(String, index=True)
     prediction = Column(String)
     confidence = Column(Float)
+    
+    __table_args__ = (
+        Index('ix_ml_predictions_user_id_desc', 'user_id', id.desc()),
+    )
 
 class MRIAnalysis(Base):
     __tablename__ = 'mri_analyses'
@@ -55,3 +67,7 @@ class MRIAnalysis(Base):
     uploaded_at = Column(DateTime(timezone=True), server_default=func.now())
     analysis_started_at = Column(DateTime(timezone=True), default=None)
     analysis_completed_at = Column(DateTime(timezone=True), default=None)
+
+    __table_args__ = (
+        Index('ix_mri_analyses_user_id_desc', 'user_id', id.desc()),
+    )
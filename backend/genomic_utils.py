@@ -11,7 +11,8 @@ This module provides comprehensive parsing and analysis of genomic files includi
 import gzip
 import logging
 import statistics
-from typing import Dict, List, Tuple, Optional, Any
+from functools import lru_cache
+from typing import Dict, List, Tuple, Optional, Any, Union, BinaryIO
 from io import BytesIO, StringIO
 import re
 from collections import defaultdict, Counter
@@ -780,11 +781,14 @@ class GenomicProcessor:
         self.quality_controller = GenomicQualityController()
         self.prs_calculator = PolygeneticRiskCalculator()
     
-    def process_genomic_file(self, file_content: bytes, filename: str) -> Dict[str, Any]:
+    def process_genomic_file(self, file_content: Union[bytes, BinaryIO], filename: str) -> Dict[str, Any]:
         """
-        Process genomic file and return comprehensive analysis
+        Process genomic file (bytes or an open binary file) and return comprehensive analysis
         """
         try:
+            if hasattr(file_content, "read"):
+                file_content = file_content.read()
+            
             # Determine file type
             file_extension = filename.lower().split('.')
             if file_extension[-1] == 'gz':
@@ -849,3 +853,8 @@ class GenomicProcessor:
                 "status": "error",
                 "message": f"PRS calculation failed: {str(e)}"
             }
+
+@lru_cache(maxsize=1)
+def get_genomic_processor() -> GenomicProcessor:
+    """Shared GenomicProcessor; its analyzers keep no per-file state"""
+    return GenomicProcessor()
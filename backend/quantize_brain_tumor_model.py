@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+INT8 quantization script for the brain tumor CNN
+Converts the Keras model to a full-integer TFLite flatbuffer for CPU-only deployments.
+Calibration uses MRI images already uploaded to the MRI upload directory.
+"""
+
+import os
+import sys
+import logging
+from pathlib import Path
+
+# Add the current directory to Python path
+sys.path.append(str(Path(__file__).parent))
+
+import numpy as np
+import tensorflow as tf
+from PIL import Image
+
+from api.enhanced_mri_analysis import get_mri_processor, BRAIN_TUMOR_TFLITE_PATH, MRI_UPLOAD_DIR
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Number of calibration images fed to the converter
+MAX_CALIBRATION_IMAGES = 100
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tiff', '.tif')
+
+def representative_dataset():
+    """Yield preprocessed MRI samples for INT8 calibration"""
+    image_paths = sorted(
+        p for p in Path(MRI_UPLOAD_DIR).iterdir() if p.suffix.lower() in IMAGE_EXTENSIONS
+    )[:MAX_CALIBRATION_IMAGES]
+    if not image_paths:
+        raise RuntimeError(f"No calibration images found in {MRI_UPLOAD_DIR}")
+    
+    for path in image_paths:
+        image_array = np.asarray(Image.open(path).convert('RGB'))
+        yield [get_mri_processor().preprocess_image_for_model(image_array).astype(np.float32)]
+
+def quantize_model():
+    """Convert the loaded Keras model to an INT8 TFLite model"""
+    try:
+        mri_processor = get_mri_processor()
+        if mri_processor.model is None:
+            raise RuntimeError("Keras brain tumor model is not loaded")
+        
+        logger.info("Starting INT8 quantization...")
+        converter = tf.lite.TFLiteConverter.from_keras_model(mri_processor.model)
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        
+        tflite_model = converter.convert()
+        os.makedirs(os.path.dirname(BRAIN_TUMOR_TFLITE_PATH), exist_ok=True)
+        with open(BRAIN_TUMOR_TFLITE_PATH, "wb") as f:
+            f.write(tflite_model)
+        
+        logger.info(f"✅ INT8 model written to {os.path.abspath(BRAIN_TUMOR_TFLITE_PATH)}")
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ Quantization failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = quantize_model()
+    sys.exit(0 if success else 1)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, Any
 from datetime import datetime
 
@@ -23,6 +23,12 @@ class UploadResponse(BaseModel):
     message: str
     status: str
 
+class PresignedUploadResponse(BaseModel):
+    genomic_data_id: int
+    url: str
+    fields: Dict[str, str]
+    key: str
+
 class PrsScoreBase(BaseModel):
     genomic_data_id: int
     disease_type: str
@@ -56,6 +62,16 @@ class MlPredictionResponse(MlPredictionBase):
     class Config:
         from_attributes = True
 
+class ClinicalData(BaseModel):
+    # Validated by trigger_ml_prediction, which answers 400 (not FastAPI's 422) on bad data;
+    # optional model inputs (pregnancies, insulin, ...) pass through unvalidated
+    model_config = ConfigDict(extra='allow')
+    
+    age: float = Field(gt=0, lt=150)
+    bmi: float = Field(gt=10, lt=60)
+    glucose_level: float = Field(gt=50, lt=500)
+    blood_pressure: float = Field(gt=60, lt=250)
+
 class MlInferenceRequest(BaseModel):
     user_id: str
     clinical_data: Dict[str, Any]
@@ -90,6 +106,18 @@ class MRIAnalysisResponse(MRIAnalysisBase):
     class Config:
         from_attributes = True
 
+class MRIAnalysisSummaryResponse(BaseModel):
+    """List-view row: the large metadata/results JSON columns are left out"""
+    id: int
+    filename: str
+    status: str
+    overall_risk_level: Optional[str] = None
+    confidence_score: Optional[float] = None
+    uploaded_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
 class MRIUploadResponse(BaseModel):
     id: int
     message: str
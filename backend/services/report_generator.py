@@ -4,7 +4,7 @@ from typing import Dict, Any, List
 from datetime import datetime
 from sqlalchemy.orm import Session
 
-from genomic_utils import GenomicProcessor
+from genomic_utils import get_genomic_processor
 from db.models import GenomicData, PrsScore
 from db.auth_models import User, PatientProfile, MedicalReport
 
@@ -14,7 +14,7 @@ class ReportGenerator:
     """Real-time medical report generation service"""
     
     def __init__(self):
-        self.genomic_processor = GenomicProcessor()
+        self.genomic_processor = get_genomic_processor()
     
     def generate_comprehensive_report(self, user_id: int, genomic_data_id: int, db: Session) -> Dict[str, Any]:
         """Generate a comprehensive medical report for a user's genomic data"""
@@ -125,7 +125,7 @@ class ReportGenerator:
         
         # Parse metadata
         try:
-            metadata = json.loads(genomic_data.metadata_json) if genomic_data.metadata_json else {}
+            metadata = genomic_data.metadata_json or {}
             summary["file_size"] = metadata.get("file_size_bytes")
             summary["upload_method"] = metadata.get("upload_method")
         except:
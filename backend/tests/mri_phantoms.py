@@ -0,0 +1,22 @@
+import numpy as np
+
+def brain_phantoms(count: int = 12, size: int = 512, seed: int = 11) -> list:
+    """
+    Synthetic axial brain slices: a noisy elliptical brain on a dark background with
+    one or two uniform bright (enhancing) or dark lesions of radius 6-44 px.
+    Deterministic for a given seed.
+    """
+    rng = np.random.default_rng(seed)
+    yy, xx = np.mgrid[:size, :size]
+    center = size / 2
+    phantoms = []
+    for _ in range(count):
+        slice_ = rng.normal(15, 4, (size, size))
+        brain = ((yy - center) / (0.4 * size)) ** 2 + ((xx - center) / (0.32 * size)) ** 2 < 1
+        slice_[brain] = rng.normal(120, 8, int(brain.sum()))
+        for _ in range(rng.integers(1, 3)):
+            radius = rng.integers(6, 45) * size // 512 * 1.0
+            cy, cx = rng.integers(int(0.3 * size), int(0.7 * size), 2)
+            slice_[(yy - cy) ** 2 + (xx - cx) ** 2 < radius * radius] = rng.choice([220, 60])
+        phantoms.append(slice_.clip(0, 255).astype(np.uint8))
+    return phantoms
@@ -0,0 +1,41 @@
+import io
+
+from api.genomic_variants import parse_vcf_variants_stream
+
+HEADER = (
+    "##fileformat=VCFv4.2\n"
+    "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tSAMPLE1\n"
+)
+RECORDS = "".join(
+    f"chr19\t{11200000 + i}\trs{i}\tA\tG\t50\tPASS\tDP=3\tGT\t0/1\n" for i in range(3)
+)
+
+def _parse(text: str) -> list:
+    return parse_vcf_variants_stream(io.StringIO(text))
+
+def test_parses_records_after_header():
+    variants = _parse(HEADER + RECORDS)
+
+    assert [v["id"] for v in variants] == ["rs0", "rs1", "rs2"]
+    assert variants[0]["chromosome"] == "19"
+    assert variants[0]["position"] == 11200000
+
+def test_short_first_record_skips_only_that_line():
+    """A record without INFO is dropped; the rest of the file still parses"""
+    variants = _parse(HEADER + "chr1\t100\t.\tA\tG\t50\tPASS\n" + RECORDS)
+
+    assert [v["id"] for v in variants] == ["rs0", "rs1", "rs2"]
+
+def test_only_short_records():
+    assert _parse(HEADER + "chr1\t100\t.\tA\tG\t50\tPASS\nchr1\t200\n") == []
+
+def test_leading_quote_is_literal():
+    """Quotes have no meaning in VCF; a field starting with one must not swallow the file"""
+    variants = _parse(HEADER + 'chr1\t100\t"rs9\tA\tG\t50\tPASS\tDP=3\n' + RECORDS)
+
+    assert [v["id"] for v in variants] == ['"rs9', "rs0", "rs1", "rs2"]
+
+def test_last_record_without_newline():
+    variants = _parse(HEADER + RECORDS + "chr2\t500\trs7\tC\tT\t20\tPASS\tDP=1")
+
+    assert [v["id"] for v in variants][-1] == "rs7"
@@ -0,0 +1,43 @@
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from api.mri_analysis import analyze_mri_image_real, analyze_mri_pyramid, prepare_mri_array
+from mri_phantoms import brain_phantoms
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "data", "mri_phantom_baseline.json")
+
+with open(BASELINE_PATH) as f:
+    BASELINE = json.load(f)["phantoms"]
+
+PHANTOMS = brain_phantoms(len(BASELINE))
+
+def _overlaps(a: dict, b: dict) -> bool:
+    return (a["x"] < b["x"] + b["width"] and b["x"] < a["x"] + a["width"]
+            and a["y"] < b["y"] + b["height"] and b["y"] < a["y"] + a["height"])
+
+@pytest.mark.parametrize("case", range(len(BASELINE)))
+def test_phantom_matches_baseline(case):
+    """Same overall risk as the baseline scan, and every high-risk finding is still reported"""
+    expected = BASELINE[case]
+    result = analyze_mri_image_real(Image.fromarray(PHANTOMS[case]))
+    
+    assert result["status"] == "success"
+    assert result["overall_assessment"]["risk_level"] == expected["risk_level"]
+    high_risk = [r["bbox"] for r in result["detected_regions"] if r["risk_level"] == "high"]
+    for region in expected["regions"]:
+        if region["risk_level"] == "high":
+            assert any(_overlaps(region["bbox"], bbox) for bbox in high_risk), region
+
+@pytest.mark.parametrize("case", range(len(BASELINE)))
+def test_pyramid_matches_full_scan(case):
+    """Screening at 256x256 and refining at 512x512 reports what a full 512x512 scan reports"""
+    img_array = prepare_mri_array(Image.fromarray(PHANTOMS[case]))
+    full = analyze_mri_image_real(img_array)
+    pyramid, pyramid_level, _ = analyze_mri_pyramid(img_array)
+    
+    assert pyramid["detected_regions"] == full["detected_regions"]
+    assert pyramid["overall_assessment"] == full["overall_assessment"]
+    assert pyramid_level == (0 if full["detected_regions"] else 1)
@@ -7,7 +7,6 @@ import io
 import json
 from io import BytesIO
 from datetime import datetime
-import boto3
 from Bio import SeqIO
 from celery import current_task
 from sqlalchemy.orm import Session
@@ -20,20 +19,13 @@ from PIL import Image
 from core.celery_app import celery_app
 from core.websockets import connection_manager
 from core.config import settings
+from core.storage import s3_client
 from db.database import SessionLocal
 from db.models import GenomicData, PrsScore, MlPrediction, MRIAnalysis
-from genomic_utils import GenomicProcessor
+from genomic_utils import get_genomic_processor
 
 logger = logging.getLogger(__name__)
 
-# Initialize S3 client
-s3_client = boto3.client(
-    's3',
-    aws_access_key_id=settings.aws_access_key_id,
-    aws_secret_access_key=settings.aws_secret_access_key,
-    region_name=settings.aws_region
-)
-
 # Load ML models at startup (for efficiency)
 DIABETES_MODEL = None
 ALZHEIMER_MODEL = None
@@ -133,7 +125,7 @@ def process_genomic_file(self, genomic_data_id: int):
         
         # Use advanced genomic processor
         try:
-            genomic_processor = GenomicProcessor()
+            genomic_processor = get_genomic_processor()
             metadata = genomic_processor.process_genomic_file(file_content, genomic_data.filename)
             
             # Check for processing errors
@@ -156,7 +148,7 @@ def process_genomic_file(self, genomic_data_id: int):
         
         # Update database record
         genomic_data.status = "completed"
-        genomic_data.metadata_json = json.dumps(metadata) if isinstance(metadata, dict) else str(metadata)
+        genomic_data.metadata_json = metadata if isinstance(metadata, dict) else str(metadata)
         db.commit()
         
         # Update progress
@@ -202,7 +194,7 @@ def calculate_prs_score(self, genomic_data_id: int, disease_type: str):
         self.update_state(state='PROGRESS', meta={'progress': 30, 'status': 'Analyzing variant data'})
         
         # Use advanced genomic processor for PRS calculation
-        genomic_processor = GenomicProcessor()
+        genomic_processor = get_genomic_processor()
         
         # Add some realistic computation time
         time.sleep(2)
@@ -327,9 +319,10 @@ def run_ml_inference(self, user_id: str, clinical_data: dict):
         db.close()
 
 @celery_app.task(bind=True, name="cg_worker.tasks.run_brain_tumor_inference")
-def run_brain_tumor_inference(self, image_data: list):
+def run_brain_tumor_inference(self, s3_key: str):
     """
-    Background task to run brain tumor inference from an image.
+    Background task to run brain tumor inference on a preprocessed (150, 150, 3)
+    uint8 array staged in S3 as .npy by the API.
     """
     try:
         logger.info("Running brain tumor inference")
@@ -347,9 +340,16 @@ def run_brain_tumor_inference(self, image_data: list):
                 "message": "Brain tumor model is not available. Please ensure the model file exists at models/brain_tumor_model.h5"
             }
         
-        image = Image.open(io.BytesIO(bytearray(image_data))).resize((150, 150))
-        image_np = np.array(image)[:, :, :3]  # Ensure 3 channels
-        image_np = np.expand_dims(image_np, axis=0)
+        # Fetch the staged array, then remove it; it is only needed for this prediction
+        response = s3_client.get_object(Bucket=settings.s3_bucket_name, Key=s3_key)
+        image_data = response['Body'].read()
+        try:
+            s3_client.delete_object(Bucket=settings.s3_bucket_name, Key=s3_key)
+        except Exception as e:
+            logger.warning(f"Failed to delete staged image {s3_key}: {e}")
+        
+        # Already decoded, RGB and resized by the API
+        image_np = np.load(io.BytesIO(image_data), allow_pickle=False)[None, ...]
 
         self.update_state(state='PROGRESS', meta={'progress': 50, 'status': 'Running inference'})
         
@@ -401,7 +401,7 @@ def run_mri_analysis_task(self, analysis_id: int, file_path: str):
         
         # Resize for analysis
         analysis_image = image.resize((512, 512), Image.Resampling.LANCZOS)
-        img_array = np.array(analysis_image, dtype=np.float32) / 255.0
+        img_array = np.asarray(analysis_image)
         
         self.update_state(state='PROGRESS', meta={'progress': 30, 'status': 'Running AI tumor detection'})
         
@@ -20,6 +20,7 @@ export interface MRIUploadResponse {
     overall_confidence: number;
     processing_time: number;
     annotated_image?: string;
+    annotated_image_url?: string;
     visualization_type?: string;
   };
   database_info: {
@@ -73,6 +74,10 @@ export const uploadMRIImage = async (
         try {
           const response = JSON.parse(xhr.responseText);
           if (response && response.success) {
+            // The backend returns a signed, expiring path to the WebP overlay (/annotated/{id}.webp) rather than an inline data URI
+            if (response.analysis?.annotated_image_url) {
+              response.analysis.annotated_image = `${API_BASE_URL}${response.analysis.annotated_image_url}`;
+            }
             resolve(response);
           } else {
             throw new Error(response.error || 'Analysis failed');